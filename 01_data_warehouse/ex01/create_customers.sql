@@ -1,29 +1,104 @@
 -- 01_data_warehouse/ex01/create_customers.sql
--- Build a consolidated customers table by stacking monthly partitions.
+-- Build a consolidated customers table as a range-partitioned table on
+-- event_time, with each monthly table attached as its own partition.
+--
+-- Attaching does not copy any rows, and date-filtered queries only scan the
+-- months they need (partition pruning). New months are added by
+-- partitions.py, which derives the partition bounds from the CSV file names.
 
 BEGIN;
 
-DROP TABLE IF EXISTS customers;
+-- A plain (non-partitioned) customers table from older runs is replaced.
+-- A partitioned one is kept: dropping it would also drop the monthly tables.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE oid = to_regclass('customers') AND relkind = 'r'
+    ) THEN
+        DROP TABLE customers;
+    END IF;
+END $$;
 
--- Create an empty table with the same schema as the reference month.
-CREATE TABLE customers (LIKE data_2022_oct INCLUDING ALL);
+-- Same columns as the reference month, partitioned by month.
+CREATE TABLE IF NOT EXISTS customers (LIKE data_2022_oct)
+    PARTITION BY RANGE (event_time);
 
--- Append all monthly datasets.
-INSERT INTO customers
-SELECT * FROM data_2022_oct
-UNION ALL
-SELECT * FROM data_2022_nov
-UNION ALL
-SELECT * FROM data_2022_dec
-UNION ALL
-SELECT * FROM data_2023_jan
-UNION ALL
-SELECT * FROM data_2023_feb;
+-- Rows outside every monthly range land here instead of failing.
+CREATE TABLE IF NOT EXISTS customers_default PARTITION OF customers DEFAULT;
 
--- Optional, but helpful for query planning.
-ANALYZE customers;
+-- Attach every month that is not attached yet. A month whose column types
+-- differ from the parent (types are inferred per file) or that has rows
+-- outside its range cannot be attached; its rows are copied into a new
+-- customers_YYYY_MM partition instead, as partitions.py does. Rows of the
+-- month already in customers_default would overlap the new partition, so
+-- they are moved out first and re-inserted through the parent afterwards.
+DO $$
+DECLARE
+    m RECORD;
+    part TEXT;
+    cols TEXT;
+    moved BIGINT;
+BEGIN
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO cols
+    FROM pg_attribute
+    WHERE attrelid = 'customers'::regclass AND attnum > 0 AND NOT attisdropped;
 
-COMMIT;
+    FOR m IN
+        SELECT * FROM (VALUES
+            ('data_2022_oct', '2022-10-01', '2022-11-01'),
+            ('data_2022_nov', '2022-11-01', '2022-12-01'),
+            ('data_2022_dec', '2022-12-01', '2023-01-01'),
+            ('data_2023_jan', '2023-01-01', '2023-02-01'),
+            ('data_2023_feb', '2023-02-01', '2023-03-01')
+        ) AS months(tbl, lo, hi)
+    LOOP
+        part := 'customers_' || to_char(m.lo::date, 'YYYY_MM');
+        IF to_regclass(m.tbl) IS NULL THEN
+            RAISE NOTICE '%: table not loaded yet, skipped', m.tbl;
+            CONTINUE;
+        END IF;
+        IF EXISTS (
+            SELECT 1 FROM pg_inherits
+            WHERE inhparent = 'customers'::regclass
+              AND inhrelid IN (to_regclass(m.tbl), to_regclass(part))
+        ) THEN
+            CONTINUE;
+        END IF;
+
+        CREATE TEMP TABLE IF NOT EXISTS default_rows (LIKE customers) ON COMMIT DROP;
+        TRUNCATE default_rows;
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM customers_default WHERE event_time >= %L AND event_time < %L '
+            'RETURNING %s) INSERT INTO default_rows (%s) SELECT %s FROM moved',
+            m.lo, m.hi, cols, cols, cols
+        );
+        GET DIAGNOSTICS moved = ROW_COUNT;
 
+        BEGIN
+            EXECUTE format(
+                'ALTER TABLE customers ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                m.tbl, m.lo, m.hi
+            );
+        EXCEPTION WHEN datatype_mismatch OR check_violation THEN
+            RAISE NOTICE '%: cannot attach (%), copying into %', m.tbl, SQLERRM, part;
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF customers FOR VALUES FROM (%L) TO (%L)',
+                part, m.lo, m.hi
+            );
+            -- Routed through the parent, so stray rows reach their own month
+            -- (or the default partition).
+            EXECUTE format('INSERT INTO customers (%s) SELECT %s FROM %I', cols, cols, m.tbl);
+        END;
 
+        IF moved > 0 THEN
+            EXECUTE format('INSERT INTO customers (%s) SELECT %s FROM default_rows', cols, cols);
+            RAISE NOTICE '%: moved % rows of its month out of customers_default', m.tbl, moved;
+        END IF;
+    END LOOP;
+END $$;
 
+-- Optional, but helpful for query planning.
+ANALYZE customers;
+
+COMMIT;
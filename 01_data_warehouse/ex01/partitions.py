@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Warehouse - Exercise 01: partitioned customers table
+
+Keeps `customers` as a table range-partitioned on event_time with one
+partition per month, derived from the monthly CSV file names
+(data_2022_oct.csv -> data_2022_oct, [2022-10-01, 2022-11-01)).
+
+- A month whose table matches the parent's columns is ATTACHed as is (no
+  rows are copied).
+- Otherwise (different column types, or rows outside the month) a
+  partition is created and the rows are copied into it.
+- Rows of the month already in the default partition (which would make the
+  new partition's bounds overlap it) are moved into the new partition.
+- A month that still cannot be added is reported and the sync goes on.
+- --benchmark compares a date-window scan on the partitioned table with the
+  same scan on a flat copy.
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+from datetime import date, datetime
+
+import psycopg2
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from db_utils import get_connection
+
+PARENT = 'customers'
+DEFAULT_PARTITION = 'customers_default'
+FLAT_COPY = 'customers_flat'
+MONTH_TABLE = re.compile(r'^data_(\d{4})_([a-z]{3})$')
+
+
+def month_bounds(table_name):
+    """data_2022_oct -> (date(2022, 10, 1), date(2022, 11, 1)), or None."""
+    m = MONTH_TABLE.match(table_name)
+    if not m:
+        return None
+    start = datetime.strptime(f"{m.group(1)}_{m.group(2)}", '%Y_%b').date()
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def months_from_folder(folder):
+    """Monthly tables (name, start, end) for every data_YYYY_mon.csv, oldest first."""
+    months = []
+    for path in glob.glob(os.path.join(folder, 'data_*.csv')):
+        table = os.path.splitext(os.path.basename(path))[0]
+        bounds = month_bounds(table)
+        if bounds:
+            months.append((table, *bounds))
+    return sorted(months, key=lambda m: m[1])
+
+
+def _relkind(cur, name):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _columns(cur, name):
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (name,))
+    return cur.fetchall()
+
+
+def _attached(cur):
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (PARENT,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def ensure_parent(cur, reference_table):
+    """Create the partitioned parent (and its default partition) if needed."""
+    kind = _relkind(cur, PARENT)
+    if kind == 'p':
+        return
+    if kind is not None:
+        # Legacy UNION ALL copy: replaced by the partitioned table.
+        print(f"Replacing non-partitioned '{PARENT}' table.")
+        cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(PARENT)))
+    cur.execute(sql.SQL("CREATE TABLE {} (LIKE {}) PARTITION BY RANGE (event_time)").format(
+        sql.Identifier(PARENT), sql.Identifier(reference_table)))
+    cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+        sql.Identifier(DEFAULT_PARTITION), sql.Identifier(PARENT)))
+
+
+def _take_default_rows(cur, columns, bounds):
+    """
+    Move the default partition's rows in [start, end) to a temporary table
+    (a partition for that range cannot be added while they are there).
+    Returns the number of rows moved.
+    """
+    cur.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE event_time >= %s AND event_time < %s)")
+                .format(sql.Identifier(DEFAULT_PARTITION)), bounds)
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS default_rows (LIKE {}) ON COMMIT DROP")
+                .format(sql.Identifier(PARENT)))
+    cur.execute("TRUNCATE default_rows")
+    cur.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {} WHERE event_time >= %s AND event_time < %s RETURNING {cols}
+        )
+        INSERT INTO default_rows ({cols}) SELECT {cols} FROM moved
+    """).format(sql.Identifier(DEFAULT_PARTITION), cols=columns), bounds)
+    return cur.rowcount
+
+
+def add_month(conn, table, start, end):
+    """
+    Attach `table` as the [start, end) partition, or copy its rows into a
+    new partition when it cannot be attached. Returns 'attached' or 'copied'.
+    """
+    cur = conn.cursor()
+    bounds = (start.isoformat(), end.isoformat())
+    columns = sql.SQL(', ').join(sql.Identifier(name) for name, _ in _columns(cur, PARENT))
+    moved = _take_default_rows(cur, columns, bounds)
+    how = _attach_or_copy(cur, table, start, bounds, columns)
+    if moved:
+        cur.execute(sql.SQL("INSERT INTO {} ({cols}) SELECT {cols} FROM default_rows").format(
+            sql.Identifier(PARENT), cols=columns))
+        print(f"  {table}: moved {moved} rows of its month out of {DEFAULT_PARTITION}")
+    return how
+
+
+def _attach_or_copy(cur, table, start, bounds, columns):
+    if _columns(cur, table) == _columns(cur, PARENT):
+        cur.execute("SAVEPOINT attach_month")
+        try:
+            cur.execute(
+                sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+                    sql.Identifier(PARENT), sql.Identifier(table)), bounds)
+            cur.execute("RELEASE SAVEPOINT attach_month")
+            return 'attached'
+        except psycopg2.errors.CheckViolation as e:
+            print(f"  {table}: rows outside {bounds[0]}..{bounds[1]}, copying instead ({e.pgerror.strip()})")
+            cur.execute("ROLLBACK TO SAVEPOINT attach_month")
+
+    partition = f"{PARENT}_{start:%Y_%m}"
+    cur.execute(
+        sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(partition), sql.Identifier(PARENT)), bounds)
+    # Routed through the parent, so stray rows end up in their own month
+    # (or in the default partition).
+    cur.execute(sql.SQL("INSERT INTO {} ({cols}) SELECT {cols} FROM {}").format(
+        sql.Identifier(PARENT), sql.Identifier(table), cols=columns))
+    return 'copied'
+
+
+def sync_partitions(conn, months):
+    """Make sure every month in `months` is part of the partitioned table."""
+    if not months:
+        print("No monthly tables found.")
+        return
+    cur = conn.cursor()
+    ensure_parent(cur, months[0][0])
+    attached = _attached(cur)
+    for table, start, end in months:
+        partition = f"{PARENT}_{start:%Y_%m}"
+        if table in attached or partition in attached:
+            print(f"  {table}: already a partition, skipped")
+            continue
+        if _relkind(cur, table) is None:
+            print(f"  {table}: table not loaded yet, skipped")
+            continue
+        t0 = time.perf_counter()
+        cur.execute("SAVEPOINT add_month")
+        try:
+            how = add_month(conn, table, start, end)
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT add_month")
+            print(f"  {table}: NOT added, {e.pgerror.strip() if e.pgerror else e}")
+            continue
+        cur.execute("RELEASE SAVEPOINT add_month")
+        print(f"  {table}: {how} as [{start}, {end}) in {time.perf_counter() - t0:.2f}s")
+    cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(PARENT)))
+    conn.commit()
+    cur.close()
+
+
+def benchmark(conn, start, end, repeats=3):
+    """
+    Time the same date-window aggregate on the partitioned table and on a flat
+    (non-partitioned) copy of it, printing the best of `repeats` runs.
+    """
+    cur = conn.cursor()
+    if _relkind(cur, FLAT_COPY) is None:
+        print(f"Creating flat copy '{FLAT_COPY}' for comparison...")
+        cur.execute(sql.SQL("CREATE UNLOGGED TABLE {} AS SELECT * FROM {}").format(
+            sql.Identifier(FLAT_COPY), sql.Identifier(PARENT)))
+        cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(FLAT_COPY)))
+        conn.commit()
+
+    query = """
+        SELECT COUNT(*), SUM(price)
+        FROM {}
+        WHERE event_time >= %s AND event_time < %s
+    """
+    for table in (PARENT, FLAT_COPY):
+        timings = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            cur.execute(sql.SQL(query).format(sql.Identifier(table)), (start, end))
+            cur.fetchall()
+            timings.append(time.perf_counter() - t0)
+        print(f"{table:>16}: best {min(timings) * 1000:.1f} ms over {repeats} runs")
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the partitioned customers table')
+    parser.add_argument('--folder', default='customer',
+                        help='Folder with the data_YYYY_mon.csv files')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare a date-window scan against a flat copy')
+    parser.add_argument('--start', default='2022-11-01', help='Benchmark window start')
+    parser.add_argument('--end', default='2022-12-01', help='Benchmark window end (exclusive)')
+    args = parser.parse_args()
+
+    conn = get_connection(dbname='piscineds')
+    try:
+        sync_partitions(conn, months_from_folder(args.folder))
+        if args.benchmark:
+            benchmark(conn, args.start, args.end)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Warehouse - Exercise 02: incremental deduplication runner
+
+The first run executes remove_duplicates.sql over the whole `customers`
+table. Later runs only merge the partitions of `customers` that are new
+since they were last processed (tracked in dedup_progress), using the same
+hash-keyed INSERT ... ON CONFLICT statements. When an already processed
+partition was reloaded or removed, both tables are rebuilt, because its old
+rows cannot be told apart from the others. Rows scanned, rows
+kept, duplicates removed and elapsed time are reported for every source.
+
+Sources are compared by db_utils.table_signature(), which includes the
+pg_stat write counters. Those are not durable: a crash restart or
+pg_stat_reset() changes every signature, and the next run rebuilds both
+tables even though no data changed (correct, only slower).
+"""
+import os
+import sys
+import time
+import argparse
+
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from db_utils import get_connection, table_partitions, table_signature
+
+FULL_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'remove_duplicates.sql')
+
+PROGRESS_DDL = """
+    CREATE TABLE IF NOT EXISTS dedup_progress (
+        source       TEXT PRIMARY KEY,
+        signature    TEXT NOT NULL,
+        rows_scanned BIGINT NOT NULL,
+        processed_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+DISTINCT_SQL = """
+    INSERT INTO customers_distinct
+    SELECT
+        md5(ROW(event_time, event_type, product_id, price, user_id)::text)::uuid,
+        event_time, event_type, product_id, price, user_id
+    FROM {source}
+    ON CONFLICT (row_hash) DO NOTHING
+"""
+
+DEDUP_SQL = """
+    INSERT INTO customers_dedup
+    SELECT
+        md5(ROW(event_type, product_id, price, user_id)::text)::uuid,
+        MIN(event_time), event_type, product_id, price, user_id
+    FROM {source}
+    GROUP BY event_type, product_id, price, user_id
+    ON CONFLICT (key_hash) DO UPDATE
+        SET event_time = EXCLUDED.event_time
+        WHERE EXCLUDED.event_time < customers_dedup.event_time
+"""
+
+
+def sources(cur):
+    """Partitions of `customers`, or the table itself when it is not partitioned."""
+    return table_partitions(cur, 'customers')
+
+
+def _count(cur, table):
+    cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table)))
+    return cur.fetchone()[0]
+
+
+def _record(cur, source, sig, rows):
+    cur.execute("""
+        INSERT INTO dedup_progress (source, signature, rows_scanned)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (source) DO UPDATE
+        SET signature = EXCLUDED.signature,
+            rows_scanned = EXCLUDED.rows_scanned,
+            processed_at = now()
+    """, (source, sig, rows))
+
+
+def full_script():
+    """
+    remove_duplicates.sql without its BEGIN/COMMIT, so full_run() can run
+    it and record the progress in a single transaction.
+    """
+    with open(FULL_SQL, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    return '\n'.join(line for line in lines if line.strip().upper() not in ('BEGIN;', 'COMMIT;'))
+
+
+def full_run(conn, rebuild=False):
+    """
+    Run remove_duplicates.sql over all of `customers` and mark every source
+    done, all in one transaction. With `rebuild`, both result tables are
+    emptied first, since the script only adds rows and would keep those of
+    reloaded sources.
+    """
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    if rebuild:
+        for table in ('customers_distinct', 'customers_dedup'):
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+            if cur.fetchone()[0]:
+                cur.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(table)))
+    cur.execute("TRUNCATE dedup_progress")
+    rows = _count(cur, 'customers')
+    cur.execute(full_script())
+    kept = _count(cur, 'customers_distinct')
+    print(f"full run: {rows} rows scanned, {kept} distinct kept, "
+          f"{rows - kept} exact duplicates removed in {time.perf_counter() - t0:.2f}s")
+    for source in sources(cur):
+        _record(cur, source, table_signature(cur, source), _count(cur, source))
+    conn.commit()
+    cur.close()
+
+
+def incremental_run(conn):
+    """Merge only the sources whose signature changed since they were processed."""
+    cur = conn.cursor()
+    cur.execute("SELECT source, signature FROM dedup_progress")
+    done = dict(cur.fetchall())
+    current = sources(cur)
+    # Rows merged from a reloaded or removed source cannot be taken back out
+    # (the results do not record their source), so rebuild instead.
+    stale = [s for s in done if s not in current or done[s] != table_signature(cur, s)]
+    if stale:
+        print(f"Already processed sources changed ({', '.join(sorted(stale))}), rebuilding.")
+        cur.close()
+        return full_run(conn, rebuild=True)
+
+    pending = [s for s in current if s not in done]
+    if not pending:
+        print("Nothing new to deduplicate.")
+        return
+
+    for source in pending:
+        t0 = time.perf_counter()
+        sig = table_signature(cur, source)
+        rows = _count(cur, source)
+        cur.execute(sql.SQL(DISTINCT_SQL).format(source=sql.Identifier(source)))
+        kept = cur.rowcount
+        cur.execute(sql.SQL(DEDUP_SQL).format(source=sql.Identifier(source)))
+        keys = cur.rowcount
+        _record(cur, source, sig, rows)
+        conn.commit()
+        print(f"{source}: {rows} rows scanned, {kept} new distinct rows, "
+              f"{rows - kept} duplicates removed, {keys} keys added/moved earlier "
+              f"in {time.perf_counter() - t0:.2f}s")
+
+    cur.execute("ANALYZE customers_distinct")
+    cur.execute("ANALYZE customers_dedup")
+    conn.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental deduplication of customers')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild both tables with remove_duplicates.sql over the whole table')
+    args = parser.parse_args()
+
+    conn = get_connection(dbname='piscineds')
+    try:
+        cur = conn.cursor()
+        cur.execute(PROGRESS_DDL)
+        # Missing tables, or tables from the former full-rebuild script.
+        cur.execute("""
+            SELECT NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'customers_distinct' AND column_name = 'row_hash'
+            )
+        """)
+        first_run = cur.fetchone()[0]
+        cur.close()
+        conn.commit()
+        if args.full or first_run:
+            full_run(conn, rebuild=args.full)
+        else:
+            incremental_run(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,103 @@
 -- 01_data_warehouse/ex02/remove_duplicates.sql
 -- Exercise: Remove duplicates
 --
--- This script builds two cleaned versions of the consolidated `customers` table:
+-- This script maintains two cleaned versions of the consolidated `customers` table:
 --
 -- 1) customers_distinct
---    Removes exact duplicate rows using DISTINCT.
+--    Removes exact duplicate rows. Each row carries row_hash, an md5 of the
+--    whole row with a unique index, so rows are merged in with
+--    INSERT ... ON CONFLICT DO NOTHING.
 --
 -- 2) customers_dedup
 --    Removes near-duplicates by keeping the earliest event_time per logical key
---    (event_type, product_id, price, user_id).
+--    (event_type, product_id, price, user_id), identified by key_hash.
+--
+-- Both inserts are idempotent: re-running the script only adds what is
+-- missing. dedup.py applies the same statements to newly attached
+-- partitions only, so later runs cost time proportional to the new data.
+-- For a full run it executes this file without the BEGIN/COMMIT lines, in
+-- the same transaction that records its progress.
+--
+-- window_dedup.py builds a third variant, customers_dedup_window, which only
+-- collapses events of the same key that are within a time tolerance.
 
 BEGIN;
 
+-- Tables built by the former full-rebuild version have no hash keys.
+DO $$
+BEGIN
+    IF to_regclass('customers_distinct') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'customers_distinct' AND column_name = 'row_hash'
+    ) THEN
+        DROP TABLE customers_distinct;
+    END IF;
+    IF to_regclass('customers_dedup') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'customers_dedup' AND column_name = 'key_hash'
+    ) THEN
+        DROP TABLE customers_dedup;
+    END IF;
+END $$;
+
 -- 1) Exact duplicates removal
-DROP TABLE IF EXISTS customers_distinct;
+CREATE TABLE IF NOT EXISTS customers_distinct AS
+SELECT
+    md5(ROW(event_time, event_type, product_id, price, user_id)::text)::uuid AS row_hash,
+    event_time,
+    event_type,
+    product_id,
+    price,
+    user_id
+FROM customers
+WITH NO DATA;
 
-CREATE TABLE customers_distinct AS
-SELECT DISTINCT
+CREATE UNIQUE INDEX IF NOT EXISTS customers_distinct_row_hash
+    ON customers_distinct (row_hash);
+
+INSERT INTO customers_distinct
+SELECT
+    md5(ROW(event_time, event_type, product_id, price, user_id)::text)::uuid,
     event_time,
     event_type,
     product_id,
     price,
     user_id
-FROM customers;
+FROM customers
+ON CONFLICT (row_hash) DO NOTHING;
 
 -- 2) Near-duplicates removal (keep earliest event per key)
-DROP TABLE IF EXISTS customers_dedup;
-
-CREATE TABLE customers_dedup AS
-WITH ranked AS (
-    SELECT
-        event_time,
-        event_type,
-        product_id,
-        price,
-        user_id,
-        ROW_NUMBER() OVER (
-            PARTITION BY event_type, product_id, price, user_id
-            ORDER BY event_time ASC
-        ) AS rn
-    FROM customers_distinct
-)
+CREATE TABLE IF NOT EXISTS customers_dedup AS
 SELECT
+    md5(ROW(event_type, product_id, price, user_id)::text)::uuid AS key_hash,
     event_time,
     event_type,
     product_id,
     price,
     user_id
-FROM ranked
-WHERE rn = 1;
+FROM customers
+WITH NO DATA;
+
+CREATE UNIQUE INDEX IF NOT EXISTS customers_dedup_key_hash
+    ON customers_dedup (key_hash);
+
+-- Keys are grouped first: ON CONFLICT DO UPDATE may touch a row only once.
+INSERT INTO customers_dedup
+SELECT
+    md5(ROW(event_type, product_id, price, user_id)::text)::uuid,
+    MIN(event_time),
+    event_type,
+    product_id,
+    price,
+    user_id
+FROM customers
+GROUP BY event_type, product_id, price, user_id
+ON CONFLICT (key_hash) DO UPDATE
+    SET event_time = EXCLUDED.event_time
+    WHERE EXCLUDED.event_time < customers_dedup.event_time;
 
 -- Optional: improve query planner statistics for downstream steps.
 ANALYZE customers_distinct;
 ANALYZE customers_dedup;
 
 COMMIT;
-
-
-
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Warehouse - Exercise 02: time-window near-duplicate removal
+
+Unlike customers_dedup (earliest event per key over the whole history),
+this collapses events that share (user_id, event_type, product_id, price)
+only when they follow each other within a time tolerance (default 1 s).
+Each event is compared with the previous event of the same key; chains of
+events closer than the tolerance collapse into their first event.
+
+The work is a single ordered pass: LAG() over a window whose sort order is
+served by an index on (key, event_time), so PostgreSQL streams the rows in
+order instead of sorting the whole table in memory. The result is written
+to customers_dedup_window; rows in/out and throughput are reported.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from db_utils import get_connection
+
+SOURCE = 'customers'
+TARGET = 'customers_dedup_window'
+
+INDEX_SQL = f"""
+    CREATE INDEX IF NOT EXISTS idx_customers_dedup_key
+    ON {SOURCE} (user_id, event_type, product_id, price, event_time)
+"""
+
+BUILD_SQL = f"""
+    CREATE TABLE {TARGET} AS
+    SELECT event_time, event_type, product_id, price, user_id
+    FROM (
+        SELECT
+            event_time, event_type, product_id, price, user_id,
+            LAG(event_time) OVER (
+                PARTITION BY user_id, event_type, product_id, price
+                ORDER BY event_time
+            ) AS prev_time
+        FROM {SOURCE}
+    ) ordered
+    WHERE prev_time IS NULL
+       OR event_time - prev_time > make_interval(secs => %s)
+"""
+
+
+def build(conn, tolerance, use_index=True):
+    """Rebuild TARGET from SOURCE; returns (rows_in, rows_out, seconds)."""
+    cur = conn.cursor()
+    if use_index:
+        t0 = time.perf_counter()
+        cur.execute(INDEX_SQL)
+        conn.commit()
+        print(f"Key index ready in {time.perf_counter() - t0:.2f}s")
+        # Favour the ordered index scan over an explicit sort.
+        cur.execute("SET LOCAL enable_sort = off")
+
+    t0 = time.perf_counter()
+    cur.execute(f"SELECT COUNT(*) FROM {SOURCE}")
+    rows_in = cur.fetchone()[0]
+    cur.execute(f"DROP TABLE IF EXISTS {TARGET}")
+    cur.execute(BUILD_SQL, (tolerance,))
+    rows_out = cur.rowcount
+    cur.execute(f"ANALYZE {TARGET}")
+    conn.commit()
+    cur.close()
+    return rows_in, rows_out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collapse near-duplicate events within a time tolerance')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='Max seconds between two events of the same key to collapse them')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Do not create the (key, event_time) index; let PostgreSQL sort')
+    args = parser.parse_args()
+
+    conn = get_connection(dbname='piscineds')
+    try:
+        rows_in, rows_out, seconds = build(conn, args.tolerance, use_index=not args.no_index)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    print(f"{TARGET}: {rows_in} rows in, {rows_out} kept, {rows_in - rows_out} collapsed "
+          f"(tolerance {args.tolerance}s) in {seconds:.2f}s "
+          f"({rows_in / seconds if seconds else 0:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
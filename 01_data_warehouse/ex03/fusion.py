@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Warehouse - Exercise 03: incremental fusion runner
+
+The first run executes fusion.sql (items_dim + customers_full from scratch).
+Later runs only do the work that changed since the previous run, tracked in
+fusion_progress:
+
+- items changed: items_dim is upserted (only rows whose attributes differ
+  are touched) and the enrichment of those products is updated in
+  customers_full.
+- new partitions of `customers`: their rows are enriched (hash join on the
+  BIGINT product key) and appended to customers_full.
+- a partition that was already fused has changed or is gone (dropped or
+  detached): full rebuild.
+
+--benchmark times a full rebuild against an incremental run that appends
+the newest month.
+"""
+import os
+import sys
+import time
+import argparse
+
+from psycopg2 import sql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from db_utils import get_connection, table_partitions, table_signature
+
+FULL_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fusion.sql')
+ITEMS = 'items'
+
+PROGRESS_DDL = """
+    CREATE TABLE IF NOT EXISTS fusion_progress (
+        source       TEXT PRIMARY KEY,
+        signature    TEXT NOT NULL,
+        processed_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+# Same selection as fusion.sql; only rows whose attributes differ are
+# rewritten, and their keys are collected in changed_products.
+ITEMS_UPSERT_SQL = """
+    WITH src AS (
+        SELECT DISTINCT ON (product_id)
+            product_id::text::BIGINT AS product_id,
+            category_id, category_code, brand, price
+        FROM items
+        WHERE product_id::text ~ '^[0-9]+$'
+        ORDER BY
+            product_id,
+            (category_id IS NULL) ASC,
+            (category_code IS NULL) ASC,
+            (brand IS NULL) ASC
+    ),
+    upserted AS (
+        INSERT INTO items_dim AS d
+            (product_id, category_id, category_code, brand, price, updated_at)
+        SELECT product_id, category_id, category_code, brand, price, now()
+        FROM src
+        ON CONFLICT (product_id) DO UPDATE
+            SET category_id = EXCLUDED.category_id,
+                category_code = EXCLUDED.category_code,
+                brand = EXCLUDED.brand,
+                price = EXCLUDED.price,
+                updated_at = EXCLUDED.updated_at
+            WHERE (d.category_id, d.category_code, d.brand, d.price)
+                IS DISTINCT FROM
+                  (EXCLUDED.category_id, EXCLUDED.category_code, EXCLUDED.brand, EXCLUDED.price)
+        RETURNING product_id
+    )
+    INSERT INTO changed_products SELECT product_id FROM upserted
+"""
+
+# Keys are compared as BIGINT, as in the upsert ("007" is product 7); the
+# CASE keeps the cast from running on ids that fail the guard.
+ITEMS_DELETE_SQL = """
+    WITH removed AS (
+        DELETE FROM items_dim d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM items i
+            WHERE CASE WHEN i.product_id::text ~ '^[0-9]+$'
+                       THEN i.product_id::text::BIGINT END = d.product_id
+        )
+        RETURNING product_id
+    )
+    INSERT INTO changed_products SELECT product_id FROM removed
+    ON CONFLICT DO NOTHING
+"""
+
+# Products that left the dimension get NULL attributes, as with the LEFT JOIN.
+PROPAGATE_SQL = """
+    UPDATE customers_full f
+    SET category_id = i.category_id,
+        category_code = i.category_code,
+        item_brand = i.brand,
+        item_price = i.price
+    FROM changed_products p
+    LEFT JOIN items_dim i ON i.product_id = p.product_id
+    WHERE f.product_id = p.product_id
+"""
+
+APPEND_SQL = """
+    INSERT INTO customers_full (
+        event_time, event_type, product_id, purchase_price, user_id,
+        user_session, category_id, category_code, item_brand, item_price
+    )
+    SELECT
+        c.event_time, c.event_type, c.product_id, c.price, c.user_id,
+        c.user_session, i.category_id, i.category_code, i.brand, i.price
+    FROM {source} AS c
+    LEFT JOIN items_dim AS i ON i.product_id = c.product_id
+"""
+
+
+def sources(cur):
+    """Partitions of `customers`, or the table itself when it is not partitioned."""
+    return table_partitions(cur, 'customers')
+
+
+def _record(cur, source, sig):
+    cur.execute("""
+        INSERT INTO fusion_progress (source, signature)
+        VALUES (%s, %s)
+        ON CONFLICT (source) DO UPDATE
+        SET signature = EXCLUDED.signature, processed_at = now()
+    """, (source, sig))
+
+
+def full_run(conn):
+    """Run fusion.sql and mark items and every customers source as fused."""
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    with open(FULL_SQL, encoding='utf-8') as f:
+        cur.execute(f.read())
+    cur.execute("SELECT COUNT(*) FROM customers_full")
+    rows = cur.fetchone()[0]
+    cur.execute("TRUNCATE fusion_progress")
+    for source in [ITEMS] + sources(cur):
+        _record(cur, source, table_signature(cur, source))
+    conn.commit()
+    cur.close()
+    seconds = time.perf_counter() - t0
+    print(f"full rebuild: {rows} rows in customers_full in {seconds:.2f}s")
+    return seconds
+
+
+def refresh_items(conn):
+    """Bring items_dim up to date and re-enrich the products that changed."""
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE changed_products (product_id BIGINT PRIMARY KEY) ON COMMIT DROP")
+    cur.execute(ITEMS_UPSERT_SQL)
+    changed = cur.rowcount
+    cur.execute(ITEMS_DELETE_SQL)
+    removed = cur.rowcount
+    cur.execute(PROPAGATE_SQL)
+    updated = cur.rowcount
+    _record(cur, ITEMS, table_signature(cur, ITEMS))
+    conn.commit()
+    cur.close()
+    print(f"items_dim: {changed} products added/changed, {removed} removed, "
+          f"{updated} customers_full rows re-enriched")
+
+
+def incremental_run(conn):
+    """Apply item changes and append new partitions; returns elapsed seconds."""
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    cur.execute("SELECT source, signature FROM fusion_progress")
+    done = dict(cur.fetchall())
+
+    current = sources(cur)
+    # The rows of a removed partition stay in customers_full until a rebuild.
+    stale = [s for s in done if s != ITEMS
+             and (s not in current or done[s] != table_signature(cur, s))]
+    if stale:
+        print(f"Already fused partitions changed ({', '.join(sorted(stale))}), rebuilding.")
+        cur.close()
+        return full_run(conn)
+
+    if done.get(ITEMS) != table_signature(cur, ITEMS):
+        refresh_items(conn)
+
+    pending = [s for s in current if s not in done]
+    for source in pending:
+        t1 = time.perf_counter()
+        sig = table_signature(cur, source)
+        cur.execute(sql.SQL(APPEND_SQL).format(source=sql.Identifier(source)))
+        rows = cur.rowcount
+        _record(cur, source, sig)
+        conn.commit()
+        print(f"{source}: {rows} rows fused in {time.perf_counter() - t1:.2f}s")
+
+    if pending:
+        cur.execute("ANALYZE customers_full")
+        conn.commit()
+    cur.close()
+    seconds = time.perf_counter() - t0
+    print(f"incremental run done in {seconds:.2f}s")
+    return seconds
+
+
+def benchmark(conn):
+    """Full rebuild vs. an incremental run that appends the newest month."""
+    full_seconds = full_run(conn)
+
+    cur = conn.cursor()
+    cur.execute("SELECT tableoid::regclass::text FROM customers ORDER BY event_time DESC LIMIT 1")
+    row = cur.fetchone()
+    if row is None:
+        print("customers is empty, nothing to compare.")
+        return
+    newest = row[0]
+    # Forget the newest partition so the incremental run has to fuse it again.
+    cur.execute(sql.SQL("""
+        DELETE FROM customers_full
+        WHERE event_time >= (SELECT MIN(event_time) FROM {})
+    """).format(sql.Identifier(newest)))
+    cur.execute("DELETE FROM fusion_progress WHERE source = %s", (newest,))
+    conn.commit()
+    cur.close()
+
+    incremental_seconds = incremental_run(conn)
+    print(f"full rebuild: {full_seconds:.2f}s | incremental ({newest}): {incremental_seconds:.2f}s"
+          f" | speedup x{full_seconds / incremental_seconds:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental fusion of customers and items')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild items_dim and customers_full from scratch')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare a full rebuild with an incremental run')
+    args = parser.parse_args()
+
+    conn = get_connection(dbname='piscineds')
+    try:
+        cur = conn.cursor()
+        cur.execute(PROGRESS_DDL)
+        cur.execute("""
+            SELECT to_regclass('items_dim') IS NULL
+                OR to_regclass('customers_full') IS NULL
+                OR NOT EXISTS (SELECT 1 FROM fusion_progress)
+        """)
+        first_run = cur.fetchone()[0]
+        cur.close()
+        conn.commit()
+        if args.benchmark:
+            benchmark(conn)
+        elif args.full or first_run:
+            full_run(conn)
+        else:
+            incremental_run(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,43 +2,42 @@
 -- Exercise: Fusion
 --
 -- Build an enriched customer events table by joining customer activity
--- with a de-duplicated view of the items reference table.
+-- with a de-duplicated, typed dimension built from the items reference table.
+--
+-- This is the full rebuild. fusion.py keeps both tables up to date
+-- incrementally afterwards (changed items, newly attached partitions).
 
 BEGIN;
 
 DROP TABLE IF EXISTS customers_full;
+DROP TABLE IF EXISTS items_dim;
+
+-- Typed, unique items dimension:
+-- - One row per product_id, stored as BIGINT and used as primary key
+-- - Non-numeric product ids can never match a customer event and are skipped
+-- - Deterministic selection if duplicates exist
+CREATE TABLE items_dim AS
+SELECT DISTINCT ON (product_id)
+    product_id::text::BIGINT AS product_id,
+    category_id,
+    category_code,
+    brand,
+    price,
+    now() AS updated_at
+FROM items
+WHERE product_id::text ~ '^[0-9]+$'
+-- Prefer rows with more information; fall back deterministically.
+ORDER BY
+    product_id,
+    (category_id IS NULL) ASC,
+    (category_code IS NULL) ASC,
+    (brand IS NULL) ASC;
+
+ALTER TABLE items_dim ADD PRIMARY KEY (product_id);
+ANALYZE items_dim;
 
--- Create a stable, unique items view:
--- - Keep a single row per product_id
--- - Ensure deterministic selection if duplicates exist
-WITH uniq_items AS (
-    SELECT DISTINCT ON (product_id)
-        product_id,
-        category_id,
-        category_code,
-        brand,
-        price
-    FROM items
-    -- Prefer rows with more information; fall back deterministically.
-    ORDER BY
-        product_id,
-        (category_id IS NULL) ASC,
-        (category_code IS NULL) ASC,
-        (brand IS NULL) ASC
-),
--- Normalize product_id to integer when safe (prevents join errors)
-items_int AS (
-    SELECT
-        CASE
-            WHEN product_id ~ '^[0-9]+$' THEN product_id::INTEGER
-            ELSE NULL
-        END AS product_id_int,
-        category_id,
-        category_code,
-        brand,
-        price
-    FROM uniq_items
-)
+-- Both join keys are integers, so the planner can hash the small dimension
+-- once and stream customers through it (no per-row regex or cast).
 SELECT
     c.event_time,
     c.event_type,
@@ -52,8 +51,8 @@ SELECT
     i.price AS item_price
 INTO customers_full
 FROM customers AS c
-LEFT JOIN items_int AS i
-    ON c.product_id = i.product_id_int;
+LEFT JOIN items_dim AS i
+    ON i.product_id = c.product_id;
 
 -- Index for common access patterns (product joins / filters)
 CREATE INDEX IF NOT EXISTS idx_customers_full_product_id
@@ -66,6 +65,3 @@ CREATE INDEX IF NOT EXISTS idx_customers_full_product_id
 ANALYZE customers_full;
 
 COMMIT;
-
-
-
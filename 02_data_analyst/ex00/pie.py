@@ -8,27 +8,122 @@ import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import glob
+import importlib.util
 import os
+import sys
+import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+import event_cache
 
-def load_data(folder_path):
-    """Load all customer CSVs from the given folder into a single DataFrame."""
-    # Patterns for files from Oct 2022 to Feb 2023
+
+def list_files(folder_path):
+    """Customer CSVs from Oct 2022 to Feb 2023 in the given folder."""
     pattern_2022 = os.path.join(folder_path, 'data_2022_*.csv')
     pattern_2023 = os.path.join(folder_path, 'data_2023_*.csv')
     files = sorted(glob.glob(pattern_2022) + glob.glob(pattern_2023))
-    dfs = []
-    for fp in files:
-        df = pd.read_csv(fp, parse_dates=['event_time'])
-        dfs.append(df)
-    if not dfs:
+    if not files:
         raise FileNotFoundError(f"No CSV files found in folder: {folder_path}")
-    return pd.concat(dfs, ignore_index=True)
+    return files
+
+
+# Explicit dtypes instead of inferred object columns; event_time stays a
+# string unless parse_dates is requested.
+EVENT_DTYPES = {
+    'event_type': 'category',
+    'product_id': 'Int64',  # nullable: blank ids are kept as <NA>
+    'price': 'float32',
+    'user_id': 'Int64',
+    'user_session': 'string',
+}
+
+
+def csv_engine():
+    """Fastest available CSV parser: pyarrow (multithreaded) if installed, else C."""
+    return 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+
+def read_month(file_path, columns=None, dtypes=None, parse_dates=False, engine=None):
+    """Read one monthly CSV, loading only `columns` with the given dtypes."""
+    if columns is None:
+        columns = list(pd.read_csv(file_path, nrows=0).columns)
+    dtypes = {**EVENT_DTYPES, **(dtypes or {})}
+    df = pd.read_csv(
+        file_path,
+        usecols=columns,
+        dtype={col: dtypes[col] for col in columns if col in dtypes},
+        engine=engine or csv_engine(),
+    )
+    if parse_dates and 'event_time' in df.columns:
+        df['event_time'] = event_cache.parse_event_times(df['event_time'])
+    return df[columns]
+
+
+def load_data(folder_path, columns=None, dtypes=None, parse_dates=False,
+              use_cache=True, engine=None):
+    """
+    Load the customer CSVs from the given folder into a single DataFrame.
+
+    - columns: columns to load (None = all of them).
+    - dtypes: overrides for EVENT_DTYPES (event_type is categorical).
+    - parse_dates: parse event_time into UTC datetimes.
+    - use_cache: when every requested column is in the memory-mapped binary
+      cache (src/event_cache.py), read from it instead of parsing the CSVs.
+      The cache stores event_time parsed, so it is only used for event_time
+      when parse_dates is set.
+    """
+    files = list_files(folder_path)
+    cached = (use_cache and columns is not None and not dtypes
+              and set(columns) <= set(event_cache.COLUMNS)
+              and (parse_dates or 'event_time' not in columns))
+    if cached:
+        dfs = [event_cache.load_frame(fp, columns) for fp in files]
+    else:
+        dfs = [read_month(fp, columns, dtypes, parse_dates, engine) for fp in files]
+    df = pd.concat(dfs, ignore_index=True)
+    # concat falls back to object when the months have different categories.
+    for col in df.columns:
+        if isinstance(dfs[0][col].dtype, pd.CategoricalDtype) and df[col].dtype == object:
+            df[col] = pd.api.types.union_categoricals([d[col] for d in dfs])
+    return df
 
 
-def plot_pie(df, output_path):
+def count_event_types(folder_path, use_cache=True):
+    """Events per event_type over all months, most frequent first."""
+    if use_cache:
+        return event_cache.event_type_counts(list_files(folder_path))
+    return load_data(folder_path, ['event_type'], use_cache=False)['event_type'].value_counts()
+
+
+def benchmark(folder_path):
+    """Time and memory of the former full load against the projected ones."""
+    files = list_files(folder_path)
+    cases = [
+        ('all columns, parse_dates (former)',
+         lambda: pd.concat([pd.read_csv(fp, parse_dates=['event_time']) for fp in files],
+                           ignore_index=True)),
+        ('event_type only, C engine',
+         lambda: load_data(folder_path, ['event_type'], use_cache=False, engine='c')),
+    ]
+    if csv_engine() == 'pyarrow':
+        cases.append(('event_type only, pyarrow engine',
+                      lambda: load_data(folder_path, ['event_type'], use_cache=False,
+                                        engine='pyarrow')))
+    cases.append(('event_type only, binary cache',
+                  lambda: load_data(folder_path, ['event_type'])))
+
+    print(f"Benchmark over {len(files)} files:")
+    for name, load in cases:
+        t0 = time.perf_counter()
+        df = load()
+        seconds = time.perf_counter() - t0
+        mb = df.memory_usage(deep=True).sum() / 1e6
+        print(f"  {name:<36} {seconds:8.2f} s {mb:10.1f} MB  ({len(df)} rows)")
+        del df
+
+
+def plot_pie(counts, output_path):
     """Create, save, and display a pie chart of event type distribution."""
-    counts = df['event_type'].value_counts()
     plt.figure(figsize=(8, 8))
     plt.pie(
         counts,
@@ -40,7 +135,8 @@ def plot_pie(df, output_path):
     plt.axis('equal')  # Ensure the pie is circular
     plt.tight_layout()
     plt.savefig(output_path)
-    plt.show()  # Display the chart interactively
+    if plt.get_backend().lower() != 'agg':
+        plt.show()  # Display the chart interactively (not when rendering headless)
     plt.close()
 
 
@@ -56,11 +152,25 @@ def main():
         default='pie_chart.png',
         help='Output file path for the pie chart (PNG)'
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Parse the CSVs directly instead of using the binary column cache'
+    )
+    parser.add_argument(
+        '--benchmark',
+        action='store_true',
+        help='Compare load time and memory of the loading strategies, then exit'
+    )
     args = parser.parse_args()
 
-    # Load data and generate pie chart
-    df = load_data(args.input_folder)
-    plot_pie(df, args.output)
+    if args.benchmark:
+        benchmark(args.input_folder)
+        return
+
+    # Count event types and generate pie chart
+    counts = count_event_types(args.input_folder, use_cache=not args.no_cache)
+    plot_pie(counts, args.output)
     print(f"Pie chart saved to {args.output}")
 
 
@@ -2,55 +2,287 @@
 # chart.py
 
 import os
+import sys
 import argparse
-import psycopg2
+import numpy as np
 from datetime import datetime
 import matplotlib.pyplot as plt
 from collections import defaultdict
 
-# Database connection parameters
-DB_NAME = "piscineds"
-DB_USER = "bea"
-DB_PASS = "mysecretpassword"
-DB_HOST = "localhost"
-DB_PORT = "5432"
-
-
-def fetch_purchases():
-    """
-    Fetch user_id, event_time, and price for all purchases
-    between 2022-10-01 and 2023-02-28.
-    """
-    sql = """
-        SELECT user_id, event_time, event_type, price
-        FROM customers
-        WHERE event_type = 'purchase'
-          AND event_time >= '2022-10-01'
-          AND event_time < '2023-03-01'
-    """
-    conn = psycopg2.connect(
-        dbname=DB_NAME, user=DB_USER,
-        password=DB_PASS, host=DB_HOST, port=DB_PORT
-    )
-    cur = conn.cursor()
-    cur.execute(sql)
-    rows = cur.fetchall()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+import psycopg2
+from db_utils import pooled_connection
+from hll import DEFAULT_ERROR, HyperLogLog, precision_for_error
+
+
+# Rows per round trip of the server-side cursor.
+BATCH_SIZE = 50000
+# DDL for the purchases_daily / purchases_monthly rollups and daily sketches.
+ROLLUP_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'purchases_rollup.sql')
+
+# Purchases without a user are left out everywhere (as in src/queries.py),
+# so the streamed, sketched and rolled-up aggregates agree. The epoch is
+# floored: a plain ::bigint cast rounds 23:59:59.5 into the next day.
+PURCHASES_SQL = """
+    SELECT user_id::bigint,
+           floor(EXTRACT(EPOCH FROM event_time))::bigint,
+           COALESCE(price, 0)::float8
+    FROM customers
+    WHERE event_type = 'purchase'
+      AND event_time >= %(start)s::timestamp
+      AND event_time < %(end)s::timestamp
+      AND user_id IS NOT NULL
+"""
+
+
+def _add_users(buckets, keys, users):
+    """Add the distinct (bucket, user) pairs of a batch to per-bucket sets."""
+    pairs = np.unique(np.stack([keys.astype('int64'), users]), axis=1)
+    for key in np.unique(pairs[0]):
+        label = str(np.array(key, dtype=keys.dtype))
+        buckets[label].update(pairs[1][pairs[0] == key].tolist())
+
+
+def _add_sketches(sketches, keys, users):
+    """Add the users of a batch to per-bucket HyperLogLog sketches."""
+    for key in np.unique(keys):
+        sketches[str(key)].add(users[keys == key])
+
+
+def _merge_months(daily_sketches):
+    """Monthly sketches as the union of their daily sketches."""
+    monthly = {}
+    for day in sorted(daily_sketches):
+        month = day[:7]
+        if month in monthly:
+            monthly[month].merge(daily_sketches[day])
+        else:
+            monthly[month] = daily_sketches[day].copy()
+    return monthly
+
+
+def _purchase_batches(conn, start, end, batch_size):
+    """
+    Yield (users, days, prices) NumPy arrays for the purchases in [start, end),
+    read through a named (server-side) cursor.
+    """
+    cur = conn.cursor(name='chart_purchases')
+    cur.itersize = batch_size
+    cur.execute(PURCHASES_SQL, {'start': start, 'end': end})
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        users = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        seconds = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+        prices = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+        yield users, seconds.astype('datetime64[s]').astype('datetime64[D]'), prices
     cur.close()
-    conn.close()
-    return rows
 
 
-def plot_daily_customers(rows, outdir):
+def aggregate_purchases(batch_size=BATCH_SIZE, exact=False, error=DEFAULT_ERROR):
     """
-    Plot daily unique customer counts and save to outdir.
+    Stream all purchases between 2022-10-01 and 2023-02-28 through a named
+    (server-side) cursor and compute, in a single pass:
+      - daily_customers:   {'YYYY-MM-DD': distinct users}
+      - monthly_sales:     {'YYYY-MM': total price}
+      - monthly_customers: {'YYYY-MM': distinct users}
+
+    Distinct users are estimated with one HyperLogLog sketch per day (fixed
+    memory, relative error ~`error`); months merge their daily sketches.
+    `exact=True` keeps per-bucket user sets instead, for validation.
     """
     daily_users = defaultdict(set)
-    for user_id, event_time, _, _ in rows:
-        date = event_time.strftime('%Y-%m-%d')
-        daily_users[date].add(user_id)
+    monthly_users = defaultdict(set)
+    precision = precision_for_error(error)
+    daily_sketches = defaultdict(lambda: HyperLogLog(precision))
+    monthly_sales = defaultdict(float)
 
-    dates = sorted(daily_users.keys())
-    counts = [len(daily_users[d]) for d in dates]
+    with pooled_connection() as conn:
+        for users, days, prices in _purchase_batches(conn, '2022-10-01', '2023-03-01', batch_size):
+            months = days.astype('datetime64[M]')
+            if exact:
+                _add_users(daily_users, days, users)
+                _add_users(monthly_users, months, users)
+            else:
+                _add_sketches(daily_sketches, days, users)
+            month_keys, month_idx = np.unique(months, return_inverse=True)
+            month_totals = np.bincount(month_idx, weights=prices)
+            for month, total in zip(month_keys, month_totals):
+                monthly_sales[str(month)] += float(total)
+
+    if exact:
+        daily_customers = {d: len(u) for d, u in daily_users.items()}
+        monthly_customers = {m: len(u) for m, u in monthly_users.items()}
+    else:
+        daily_customers = {d: s.count() for d, s in daily_sketches.items()}
+        monthly_customers = {m: s.count() for m, s in _merge_months(daily_sketches).items()}
+    return {
+        'daily_customers': daily_customers,
+        'monthly_sales': dict(monthly_sales),
+        'monthly_customers': monthly_customers,
+    }
+
+
+def refresh_sketches(error=DEFAULT_ERROR, full=False, batch_size=BATCH_SIZE):
+    """
+    Bring purchases_daily_sketch up to date with `customers`.
+
+    Only the last stored day (which may have been partial) and later days
+    are streamed and sketched; history is never recounted. A full rebuild
+    happens with `full=True` or when the stored sketches were built for a
+    different error bound.
+    """
+    precision = precision_for_error(error)
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        with open(ROLLUP_SQL, encoding='utf-8') as f:
+            cur.execute(f.read())
+        cur.execute("SELECT DISTINCT hll_precision FROM purchases_daily_sketch")
+        stored = {row[0] for row in cur.fetchall()}
+        since = None
+        if not full and stored <= {precision}:
+            cur.execute("SELECT max(day) FROM purchases_daily_sketch")
+            since = cur.fetchone()[0]
+        since = since.isoformat() if since is not None else '-infinity'
+
+        sketches = defaultdict(lambda: HyperLogLog(precision))
+        revenue = defaultdict(float)
+        events = defaultdict(int)
+        for users, days, prices in _purchase_batches(conn, since, 'infinity', batch_size):
+            _add_sketches(sketches, days, users)
+            day_keys, day_idx = np.unique(days, return_inverse=True)
+            totals = np.bincount(day_idx, weights=prices)
+            counts = np.bincount(day_idx)
+            for day, total, n in zip(day_keys, totals, counts):
+                revenue[str(day)] += float(total)
+                events[str(day)] += int(n)
+
+        cur.execute("DELETE FROM purchases_daily_sketch WHERE day >= %s::date", (since,))
+        cur.executemany("""
+            INSERT INTO purchases_daily_sketch (day, hll_precision, registers, revenue, n_events)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(day, precision, psycopg2.Binary(sketch.to_bytes()), revenue[day], events[day])
+              for day, sketch in sketches.items()])
+        conn.commit()
+        cur.close()
+    print(f"Sketches refreshed from {since} ({len(sketches)} days sketched, "
+          f"precision {precision}, ~{1.04 / (1 << precision) ** 0.5:.2%} error).")
+
+
+def load_sketches(start='2022-10-01', end='2023-03-01'):
+    """
+    Chart aggregates for [start, end) from the stored daily sketches, with
+    monthly distinct users obtained by merging the days of each month.
+    Returns the same structure as aggregate_purchases().
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT day, hll_precision, registers, revenue FROM purchases_daily_sketch
+            WHERE day >= %s AND day < %s
+        """, (start, end))
+        rows = cur.fetchall()
+        cur.close()
+
+    daily_sketches = {
+        day.isoformat(): HyperLogLog.from_bytes(precision, bytes(registers))
+        for day, precision, registers, _ in rows
+    }
+    monthly_sales = defaultdict(float)
+    for day, _, _, rev in rows:
+        monthly_sales[day.strftime('%Y-%m')] += float(rev)
+    return {
+        'daily_customers': {d: s.count() for d, s in daily_sketches.items()},
+        'monthly_sales': dict(monthly_sales),
+        'monthly_customers': {m: s.count() for m, s in _merge_months(daily_sketches).items()},
+    }
+
+
+def refresh_rollups(full=False):
+    """
+    Bring purchases_daily / purchases_monthly up to date with `customers`.
+
+    Incremental by default: the last rolled-up day (which may have been
+    partial) and everything after it are recomputed, along with the month
+    that day belongs to. `full=True` rebuilds both tables from scratch.
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        with open(ROLLUP_SQL, encoding='utf-8') as f:
+            cur.execute(f.read())
+
+        since = None
+        if not full:
+            cur.execute("SELECT max(day) FROM purchases_daily")
+            since = cur.fetchone()[0]
+        params = {'since': since if since is not None else '-infinity'}
+
+        cur.execute("DELETE FROM purchases_daily WHERE day >= %(since)s::timestamp", params)
+        cur.execute("""
+            INSERT INTO purchases_daily (day, distinct_users, revenue, n_events)
+            SELECT event_time::date, COUNT(DISTINCT user_id),
+                   COALESCE(SUM(price::numeric), 0), COUNT(*)
+            FROM customers
+            WHERE event_type = 'purchase'
+              AND event_time >= %(since)s::timestamp
+              AND user_id IS NOT NULL
+            GROUP BY 1
+        """, params)
+        days = cur.rowcount
+
+        cur.execute("""
+            DELETE FROM purchases_monthly
+            WHERE month >= date_trunc('month', %(since)s::timestamp)
+        """, params)
+        cur.execute("""
+            INSERT INTO purchases_monthly (month, distinct_users, revenue, n_events)
+            SELECT date_trunc('month', event_time)::date, COUNT(DISTINCT user_id),
+                   COALESCE(SUM(price::numeric), 0), COUNT(*)
+            FROM customers
+            WHERE event_type = 'purchase'
+              AND event_time >= date_trunc('month', %(since)s::timestamp)
+              AND user_id IS NOT NULL
+            GROUP BY 1
+        """, params)
+        conn.commit()
+        cur.close()
+    print(f"Rollups refreshed from {params['since']} ({days} days recomputed).")
+
+
+def load_rollups(start='2022-10-01', end='2023-03-01'):
+    """
+    Read the chart aggregates for [start, end) from the rollup tables.
+    Returns the same structure as aggregate_purchases().
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT day, distinct_users FROM purchases_daily
+            WHERE day >= %s AND day < %s
+        """, (start, end))
+        daily_customers = {day.isoformat(): n for day, n in cur.fetchall()}
+        cur.execute("""
+            SELECT month, distinct_users, revenue FROM purchases_monthly
+            WHERE month >= date_trunc('month', %s::date) AND month < %s
+        """, (start, end))
+        monthly = cur.fetchall()
+        cur.close()
+
+    return {
+        'daily_customers': daily_customers,
+        'monthly_sales': {m.strftime('%Y-%m'): float(rev) for m, _, rev in monthly},
+        'monthly_customers': {m.strftime('%Y-%m'): n for m, n, _ in monthly},
+    }
+
+
+def plot_daily_customers(aggregates, outdir):
+    """
+    Plot daily unique customer counts and save to outdir.
+    """
+    daily_customers = aggregates['daily_customers']
+    dates = sorted(daily_customers.keys())
+    counts = [daily_customers[d] for d in dates]
 
     plt.figure(figsize=(12, 5))
     plt.plot(dates, counts, linewidth=1)
@@ -71,15 +303,11 @@ def plot_daily_customers(rows, outdir):
     print(f"Saved: {path}")
 
 
-def plot_monthly_sales(rows, outdir):
+def plot_monthly_sales(aggregates, outdir):
     """
     Plot total monthly sales and save to outdir.
     """
-    monthly_sales = defaultdict(float)
-    for _, event_time, _, price in rows:
-        month = event_time.strftime('%Y-%m')
-        monthly_sales[month] += price
-
+    monthly_sales = aggregates['monthly_sales']
     months = sorted(monthly_sales.keys())
     sales = [monthly_sales[m] for m in months]
 
@@ -96,20 +324,16 @@ def plot_monthly_sales(rows, outdir):
     print(f"Saved: {path}")
 
 
-def plot_monthly_avg_spend(rows, outdir):
+def plot_monthly_avg_spend(aggregates, outdir):
     """
     Plot average spend per customer per month and save to outdir.
     """
-    monthly_sales = defaultdict(float)
-    monthly_users = defaultdict(set)
-    for user_id, event_time, _, price in rows:
-        month = event_time.strftime('%Y-%m')
-        monthly_sales[month] += price
-        monthly_users[month].add(user_id)
+    monthly_sales = aggregates['monthly_sales']
+    monthly_customers = aggregates['monthly_customers']
 
     months = sorted(monthly_sales.keys())
     avg_spend = [
-        monthly_sales[m] / len(monthly_users[m]) for m in months
+        monthly_sales[m] / monthly_customers[m] for m in months
     ]
     labels = [
         datetime.strptime(m, '%Y-%m').strftime('%b') for m in months
@@ -136,18 +360,44 @@ def main():
         '--outdir',
         default='.',
         help='Output directory for the charts (PNG)')
+    parser.add_argument(
+        '--source',
+        choices=['rollup', 'sketch', 'stream'],
+        default='rollup',
+        help='Read the maintained rollup tables, the stored daily HyperLogLog '
+             'sketches, or stream raw purchases')
+    parser.add_argument(
+        '--full-refresh',
+        action='store_true',
+        help='Rebuild the rollup/sketch tables instead of refreshing new days only')
+    parser.add_argument(
+        '--error',
+        type=float,
+        default=DEFAULT_ERROR,
+        help='Relative error bound of the distinct-customer sketches')
+    parser.add_argument(
+        '--exact',
+        action='store_true',
+        help='With --source stream, count distinct customers exactly (validation)')
     args = parser.parse_args()
 
     # 1. Ensure output directory exists
     os.makedirs(args.outdir, exist_ok=True)
 
-    # 2. Fetch data
-    purchases = fetch_purchases()
+    # 2. Aggregate purchases (rollup tables, sketches, or one streaming pass)
+    if args.source == 'rollup':
+        refresh_rollups(full=args.full_refresh)
+        aggregates = load_rollups()
+    elif args.source == 'sketch':
+        refresh_sketches(args.error, full=args.full_refresh)
+        aggregates = load_sketches()
+    else:
+        aggregates = aggregate_purchases(exact=args.exact, error=args.error)
 
     # 3. Generate and save charts
-    plot_daily_customers(purchases, args.outdir)
-    plot_monthly_sales(purchases, args.outdir)
-    plot_monthly_avg_spend(purchases, args.outdir)
+    plot_daily_customers(aggregates, args.outdir)
+    plot_monthly_sales(aggregates, args.outdir)
+    plot_monthly_avg_spend(aggregates, args.outdir)
 
     print("\nAll charts generated successfully.")
 
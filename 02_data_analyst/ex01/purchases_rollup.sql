@@ -0,0 +1,40 @@
+-- 02_data_analyst/ex01/purchases_rollup.sql
+-- Rollup tables read by chart.py instead of the raw purchase events.
+--
+-- purchases_daily   : one row per day   (distinct buyers, revenue, events)
+-- purchases_monthly : one row per month (distinct buyers cannot be summed
+--                     from daily counts, so months get their own rollup)
+--
+-- Both are refreshed incrementally by chart.refresh_rollups().
+--
+-- purchases_daily_sketch : one HyperLogLog sketch of the day's buyers (see
+--                          src/hll.py), merged into monthly counts by
+--                          chart.load_sketches(); refreshed by
+--                          chart.refresh_sketches().
+
+CREATE TABLE IF NOT EXISTS purchases_daily (
+    day            DATE PRIMARY KEY,
+    distinct_users INTEGER NOT NULL,
+    revenue        NUMERIC NOT NULL,
+    n_events       BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS purchases_monthly (
+    month          DATE PRIMARY KEY,
+    distinct_users INTEGER NOT NULL,
+    revenue        NUMERIC NOT NULL,
+    n_events       BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS purchases_daily_sketch (
+    day            DATE PRIMARY KEY,
+    hll_precision  SMALLINT NOT NULL,
+    registers      BYTEA NOT NULL,
+    revenue        NUMERIC NOT NULL,
+    n_events       BIGINT NOT NULL
+);
+
+-- Lets the incremental refresh read only the newest purchase events.
+CREATE INDEX IF NOT EXISTS idx_customers_purchase_time
+    ON customers (event_time)
+    WHERE event_type = 'purchase';
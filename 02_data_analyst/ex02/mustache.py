@@ -10,68 +10,127 @@ Generate three boxplots of purchase_price:
     with outliers computed on the filtered data.
 """
 import os
+import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
 import matplotlib.ticker as ticker
-from sqlalchemy import create_engine, text
-
-# Database configuration via environment variables
-DB_PARAMS = dict(
-    dbname=os.getenv('POSTGRES_DB', 'piscineds'),
-    user=os.getenv('POSTGRES_USER', 'bea'),
-    password=os.getenv('POSTGRES_PASSWORD', 'mysecretpassword'),
-    host=os.getenv('DB_HOST', 'localhost'),
-    port=os.getenv('DB_PORT', '5432')
-)
-
-def fetch_data(start, end):
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from queries import day_range, fetch_df, month_windows, stream
+from parquet_store import read_customers
+from quantiles import QuantileSketch
+
+DESCRIBE_KEYS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+# Above this many distinct outlier values, outliers are drawn as a binned strip.
+MAX_FLIERS = 2000
+FLIER_BINS = 200
+
+def fetch_data(start, end, source='db'):
     """
-    Fetch purchase data from the database using SQLAlchemy and pandas.
+    Fetch purchase data over the half-open window [start, end + 1 day), either
+    with the prepared 'purchase_prices' query ('db') or from the local Parquet
+    export of customers_full ('parquet', no database needed).
     Returns a pandas DataFrame with 'price' and 'user_id' for purchase events.
     """
-    sql = text(f"""
-        SELECT purchase_price AS price, user_id
-        FROM customers_full
-        WHERE event_type='purchase'
-          AND event_time BETWEEN '{start} 00:00:00' AND '{end} 23:59:59'
-          AND purchase_price IS NOT NULL
-          AND user_id IS NOT NULL;
-    """)
-    url = (
-        f"postgresql://{DB_PARAMS['user']}:{DB_PARAMS['password']}"
-        f"@{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['dbname']}"
-    )
     try:
-        engine = create_engine(url)
-        print(f"Connecting to database at {DB_PARAMS['host']}:{DB_PARAMS['port']}...")
-        df = pd.read_sql_query(sql, engine)
+        window = day_range(start, end)
+        if source == 'parquet':
+            df = read_customers(
+                columns=['purchase_price', 'user_id'],
+                filters=[('event_type', '=', 'purchase')],
+                start=window[0], end=window[1],
+            ).dropna().rename(columns={'purchase_price': 'price'})
+            print(f"Read {len(df)} rows from the Parquet export.")
+            return df
+        df = fetch_df('purchase_prices', *window)
         print(f"Fetched {len(df)} rows from the database.")
         return df
     except Exception as e:
         print(f"Error fetching data from database: {e}")
-        print(f"Attempted connection with params: {DB_PARAMS}")
         raise  # Re-raise the exception
 
 
+def fetch_aggregates(start, end):
+    """
+    Fetch only what the plots need, aggregated in the database: one row per
+    distinct purchase price (with its count) and one average per user. Both
+    queries run concurrently, each on its own pooled connection.
+    Returns (QuantileSketch of the prices, Series of average price per user).
+    """
+    window = day_range(start, end)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            price_counts = pool.submit(fetch_df, 'purchase_price_counts', *window)
+            user_avgs = pool.submit(fetch_df, 'user_avg_prices', *window)
+            price_counts, user_avgs = price_counts.result(), user_avgs.result()
+    except Exception as e:
+        print(f"Error fetching aggregates from database: {e}")
+        raise
+
+    sketch = QuantileSketch().add_counts(price_counts['price'].values, price_counts['n'].values)
+    avg_per_user = user_avgs.set_index('user_id')['avg_price']
+    print(f"Fetched {len(price_counts)} distinct prices ({sketch.n} purchases) "
+          f"and {len(avg_per_user)} user averages from the database.")
+    return sketch, avg_per_user
+
+
+def stream_price_sketch(start, end):
+    """
+    Quantile sketch of all purchase prices in [start, end + 1 day), built
+    month by month from server-side cursor batches and merged, so the prices
+    are never all held in memory.
+    """
+    total = QuantileSketch()
+    for lo, hi in month_windows(*day_range(start, end)):
+        month = QuantileSketch()
+        for rows in stream('purchase_prices', lo, hi):
+            month.add(np.fromiter((r[0] for r in rows), dtype=np.float64, count=len(rows)))
+        print(f"  {lo:%Y-%m}: {month.n} prices")
+        total.merge(month)
+    return total
+
+
+def summarize(sketch, whis=1.5):
+    """describe()-style statistics plus box-plot statistics of a sketch."""
+    stats = sketch.describe()
+    box = sketch.box_stats(whis)
+    stats.update({k: box[k] for k in ('iqr', 'whislo', 'whishi', 'n_low_outliers', 'n_high_outliers')})
+    return stats
+
+
+def print_box_stats(title, stats):
+    print(f"\n--- {title} ---")
+    print(f"Count: {int(stats['count'])}")
+    print(f"Min: {stats['min']:.4f}, Max: {stats['max']:.4f}")
+    print(f"Q1: {stats['25%']:.4f}, Median: {stats['50%']:.4f}, Q3: {stats['75%']:.4f}, "
+          f"IQR: {stats['iqr']:.4f}")
+    print(f"Whiskers: {stats['whislo']:.4f} .. {stats['whishi']:.4f}, "
+          f"outliers: {stats['n_low_outliers']} low / {stats['n_high_outliers']} high")
+    print("-" * (len(title) + 8) + "\n")
+
+
 def compute_stats(df: pd.DataFrame):
     """
     Calculate descriptive statistics for overall prices and average price per user.
 
     Returns:
-      - stats: dict with descriptive statistics for overall prices
-      - all_prices: numpy array of all purchase prices
+      - stats: dict with descriptive and box-plot statistics for overall prices
+      - price_sketch: QuantileSketch of all purchase prices (for plot_box)
       - avg_per_user: pandas Series of average purchase price per user
     """
     if df.empty or 'price' not in df.columns:
         print("Warning: No data or 'price' column available for statistics.")
-        return {}, np.array([]), pd.Series(dtype=float)
+        return {}, QuantileSketch(), pd.Series(dtype=float)
 
     prices = df['price']
 
-    # Calculate overall statistics
-    stats = prices.describe(percentiles=[.25, .5, .75]).to_dict()
+    # Calculate overall statistics in a single pass over the prices
+    price_sketch = QuantileSketch().add(prices.values)
+    stats = summarize(price_sketch)
 
     # Calculate average price per user
     if 'user_id' not in df.columns:
@@ -81,25 +140,55 @@ def compute_stats(df: pd.DataFrame):
         # Calculate the mean price for each user
         avg_per_user = df.groupby('user_id')['price'].mean()
 
-    return stats, prices.values, avg_per_user
+    return stats, price_sketch, avg_per_user
+
+
+def _draw_outlier_strip(ax, values, counts, median, color, bins):
+    """Outliers binned per side of the box, drawn with opacity by log count."""
+    for side in (values < median, values > median):
+        if not side.any():
+            continue
+        hist, edges = np.histogram(values[side], bins=bins, weights=counts[side])
+        keep = hist > 0
+        alpha = 0.15 + 0.85 * np.log1p(hist[keep]) / np.log1p(hist.max())
+        rgba = np.tile(mcolors.to_rgba(color), (keep.sum(), 1))
+        rgba[:, 3] = alpha
+        spans = list(zip(edges[:-1][keep], np.diff(edges)[keep]))
+        ax.broken_barh(spans, (0.95, 0.1), facecolors=rgba, linewidth=0, zorder=2)
 
 
 def plot_box(
     data, ax, title, xlabel, facecolor, edgecolor,
     showfliers, xlim=None, whis=1.5
 ):
-    """Generate and style a horizontal box plot on a given axes (ax)."""
-    # Ensure data is a numpy array for plotting
-    if not isinstance(data, np.ndarray):
-        data_np = np.array(data)
+    """
+    Generate and style a horizontal box plot on a given axes (ax).
+
+    `data` is either an array of values or a QuantileSketch. The box is drawn
+    from precomputed statistics with ax.bxp, so the raw values are never
+    re-sorted by Matplotlib. Each distinct outlier value is drawn once; above
+    MAX_FLIERS distinct outliers they are binned into a density strip beyond
+    the whiskers, which keeps render time and file size bounded.
+    """
+    if isinstance(data, QuantileSketch):
+        sketch = data
     else:
-        data_np = data
+        sketch = QuantileSketch(resolution=None).add(np.asarray(data, dtype=np.float64))
 
-    if data_np.size == 0:
+    if sketch.n == 0:
         print(f"Warning: No data points to plot for '{title}'. Skipping.")
         ax.set_visible(False)  # Hide the axis if no data
         return
 
+    box = sketch.box_stats(whis)
+    fliers, flier_counts = sketch.outliers(whis) if showfliers else (np.array([]), np.array([]))
+    binned = fliers.size > MAX_FLIERS
+    stats = [{
+        'med': box['med'], 'q1': box['q1'], 'q3': box['q3'],
+        'whislo': box['whislo'], 'whishi': box['whishi'], 'mean': box['mean'],
+        'fliers': np.array([]) if binned else fliers,
+    }]
+
     # Define consistent styling properties
     boxprops = dict(facecolor=facecolor, edgecolor=edgecolor)
     whiskerprops = dict(color=edgecolor)
@@ -114,18 +203,19 @@ def plot_box(
         markeredgecolor=edgecolor,
     )
 
-    ax.boxplot(
-        data_np,
+    ax.bxp(
+        stats,
         vert=False,            # Horizontal box plot
         patch_artist=True,     # Fill with color
         showfliers=showfliers, # Show/hide outliers
-        whis=whis,             # Whiskers length
         boxprops=boxprops,
         whiskerprops=whiskerprops,
         capprops=capprops,
         medianprops=medianprops,
         flierprops=flierprops,
     )
+    if binned:
+        _draw_outlier_strip(ax, fliers, flier_counts, box['med'], edgecolor, FLIER_BINS)
 
     ax.set_title(title)
     ax.set_xlabel(xlabel)
@@ -147,57 +237,50 @@ def main():
                         help='End date (YYYY-MM-DD)')
     parser.add_argument('--outdir', default='.',
                         help='Output directory for PNGs')
+    parser.add_argument('--source', choices=['db', 'parquet'], default='db',
+                        help='Read from PostgreSQL or from the Parquet export (src/parquet_store.py)')
+    parser.add_argument('--stats-only', action='store_true',
+                        help='Stream the prices month by month and print box-plot statistics only')
     args = parser.parse_args()
 
+    if args.stats_only:
+        print_box_stats('Purchase Price Box Statistics (Streamed)',
+                        summarize(stream_price_sketch(args.start, args.end)))
+        return
+
     # Create output directory if it doesn't exist
     os.makedirs(args.outdir, exist_ok=True)
 
-    # 1) Fetch data
-    df = fetch_data(args.start, args.end)
+    # 1) Fetch data and 2) compute statistics: aggregated in the database,
+    #    or from the purchase rows of the Parquet export
+    if args.source == 'db':
+        price_sketch, avg_per_user = fetch_aggregates(args.start, args.end)
+        stats = summarize(price_sketch) if price_sketch.n else {}
+    else:
+        df = fetch_data(args.start, args.end, args.source)
 
-    if df.empty:
-        print("No purchase data found in the specified date range. Cannot calculate stats or generate plots.")
-        return
+        if df.empty:
+            print("No purchase data found in the specified date range. Cannot calculate stats or generate plots.")
+            return
 
-    # 2) Compute statistics and get data arrays
-    stats, all_prices, avg_per_user = compute_stats(df)
+        stats, price_sketch, avg_per_user = compute_stats(df)
 
-    if all_prices.size == 0:
+    if price_sketch.n == 0:
         print("No valid prices found after fetching. Cannot generate plots.")
         return
 
     print("\n--- Purchase Price Descriptive Statistics (Overall) ---")
-    for k, v in stats.items():
-        print(f"{k.capitalize():>6}: {v:.6f}")
+    for k in DESCRIBE_KEYS:
+        print(f"{k.capitalize():>6}: {stats[k]:.6f}")
     print("-----------------------------------------------------\n")
 
-    print("\n--- Debug: Overall Purchase Prices Data Range ---")
-    if all_prices.size > 0:
-        print(f"Count: {all_prices.size}")
-        print(f"Min: {np.min(all_prices):.4f}, Max: {np.max(all_prices):.4f}")
-        print(
-            f"Q1: {np.percentile(all_prices, 25):.4f}, "
-            f"Median: {np.percentile(all_prices, 50):.4f}, "
-            f"Q3: {np.percentile(all_prices, 75):.4f}"
-        )
-    else:
-        print("No overall purchase price data.")
-    print("-------------------------------------------------\n")
+    print_box_stats('Debug: Overall Purchase Prices Data Range', stats)
 
-    print("\n--- Debug: Average Price Per User Data Range ---")
     if avg_per_user.size > 0:
-        # Convert to numpy array for debug prints
-        avg_per_user_np = avg_per_user.values
-        print(f"Count: {avg_per_user_np.size}")
-        print(f"Min: {np.min(avg_per_user_np):.4f}, Max: {np.max(avg_per_user_np):.4f}")
-        print(
-            f"Q1: {np.percentile(avg_per_user_np, 25):.4f}, "
-            f"Median: {np.percentile(avg_per_user_np, 50):.4f}, "
-            f"Q3: {np.percentile(avg_per_user_np, 75):.4f}"
-        )
+        print_box_stats('Debug: Average Price Per User Data Range',
+                        summarize(QuantileSketch(resolution=None).add(avg_per_user.values)))
     else:
         print("No average price per user data.")
-    print("------------------------------------------------\n")
 
     # 3) Generate box plots matching the expected examples
 
@@ -205,7 +288,7 @@ def main():
     print("Generating Box Plot 1 (Overall Purchase Price Distribution)...")
     fig1, ax1 = plt.subplots(figsize=(8, 3))
     plot_box(
-        all_prices, ax1,
+        price_sketch, ax1,
         'Overall Purchase Price Distribution', 'Price (A$)',
         facecolor='lightgray', edgecolor='black', showfliers=True,
         xlim=(-70, 350), whis=1.5
@@ -219,7 +302,7 @@ def main():
     print("Generating Box Plot 2 (Purchase Price Common Range)...")
     fig2, ax2 = plt.subplots(figsize=(8, 3))
     plot_box(
-        all_prices, ax2,
+        price_sketch, ax2,
         'Purchase Price Distribution (Common Range)', 'Price (A$)',
         facecolor='lightgreen', edgecolor='darkgreen', showfliers=False,
         xlim=(-1, 13), whis=1.5
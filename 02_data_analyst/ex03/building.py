@@ -3,7 +3,7 @@
 """
 Data Viz - Exercise 03: Highest Building
 
-- Connects to PostgreSQL using SQLAlchemy and environment variables.
+- Connects to PostgreSQL through the shared pool in src/db_utils.py.
 - Fetches purchase event data (using the 'purchase_price' column),
   then computes purchase frequency and total spending per user.
 - Filters to keep only users whose total spending is below 225 (as required).
@@ -16,41 +16,16 @@ Data Viz - Exercise 03: Highest Building
 """
 
 import os
+import sys
 import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError  # Specific exception handling
+import psycopg2
 
-
-# --- Database connection parameters from environment variables ---
-DB_PARAMS = {
-    "dbname": os.getenv("POSTGRES_DB", "piscineds"),
-    "user": os.getenv("POSTGRES_USER", "bea"),
-    "password": os.getenv("POSTGRES_PASSWORD", "mysecretpassword"),
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": int(os.getenv("DB_PORT", "5432")),
-}
-
-
-def get_engine():
-    """Create a SQLAlchemy engine using psycopg2."""
-    url = (
-        f"postgresql+psycopg2://{DB_PARAMS['user']}:{DB_PARAMS['password']}"
-        f"@{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['dbname']}"
-    )
-    try:
-        engine = create_engine(url)
-        # Attempt to connect to validate credentials/host/port/dbname
-        with engine.connect():
-            print("Database connection successful!")
-        return engine
-    except SQLAlchemyError as e:
-        print(f"Error connecting to the database: {e}")
-        print(f"Please check database parameters: {DB_PARAMS}")
-        raise  # Stop execution if the connection fails
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from feature_store import load_user_features
 
 
 def fetch_metrics(start, end):
@@ -60,28 +35,14 @@ def fetch_metrics(start, end):
       - purchase_count: number of purchases within the date range
       - total_spending: sum of purchase_price within the date range (filtered < 225)
 
-    Note: The < 225 filter is applied at the SQL level via HAVING.
+    Note: The metrics come from the shared user feature store (built once per
+    date range); the < 225 filter is applied when reading it.
     """
-    query = text(f"""
-        SELECT
-            user_id,
-            COUNT(*) AS purchase_count,
-            SUM(purchase_price::numeric) AS total_spending
-        FROM customers_full
-        WHERE event_type = 'purchase'
-          AND event_time >= '{start} 00:00:00'
-          AND event_time <= '{end} 23:59:59'
-          AND purchase_price IS NOT NULL
-          AND user_id IS NOT NULL
-        GROUP BY user_id
-        HAVING SUM(purchase_price::numeric) < 225;
-    """)
-    engine = get_engine()
     try:
-        df = pd.read_sql_query(query, engine)
+        df = load_user_features(start, end, max_spending=225)
         print(f"Fetched {len(df)} rows for users with total spending < 225.")
         return df
-    except SQLAlchemyError as e:
+    except psycopg2.Error as e:
         print(f"Error fetching data from database: {e}")
         raise
 
@@ -3,81 +3,44 @@
 """
 Data Viz - Exercise 04: Elbow
 
-– Connects to PostgreSQL using SQLAlchemy and environment variables.
+– Connects to PostgreSQL through the shared pool in src/db_utils.py.
 – Fetches purchase frequency and total spending for ALL users.
 – Scales the frequency and total spending features using StandardScaler.
-– Applies K-Means clustering for a range of cluster numbers (k).
-– Calculates the Within-Cluster Sum of Squares (WCSS) for each k.
+– Applies K-Means clustering for a range of cluster numbers (k) with the
+  k-sweep engine in src/ksweep.py (parallel or warm-started, optionally
+  MiniBatchKMeans).
+– Reports the Within-Cluster Sum of Squares (WCSS), a sampled silhouette
+  score and the fit time for each k.
 – Plots the WCSS against the number of clusters (the Elbow Method curve).
 – Saves the Elbow Method plot to the specified output directory.
 """
 
 import os
+import sys
 import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns # Often used for plotting style
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans # Correct import for KMeans
-
-# --- Database connection parameters from environment ---
-DB_PARAMS = {
-    "dbname":    os.getenv("POSTGRES_DB", "piscineds"),
-    "user":      os.getenv("POSTGRES_USER", "bea"),
-    "password":  os.getenv("POSTGRES_PASSWORD", "mysecretpassword"),
-    "host":      os.getenv("DB_HOST", "localhost"),
-    "port":      int(os.getenv("DB_PORT", "5432")),
-}
-
-def get_engine():
-    """Crea un SQLAlchemy engine usando psycopg2."""
-    # Use psycopg2 dialect explicitly for better compatibility
-    url = (
-        f"postgresql+psycopg2://{DB_PARAMS['user']}:{DB_PARAMS['password']}"
-        f"@{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['dbname']}"
-    )
-    try:
-        engine = create_engine(url)
-        # Attempt to connect to validate credentials/host/port/dbname
-        with engine.connect() as conn:
-            print("Database connection successful!")
-        return engine
-    except SQLAlchemyError as e:
-        print(f"Error connecting to the database: {e}")
-        print(f"Please check database parameters: {DB_PARAMS}")
-        # It's better to return None or raise a custom exception here
-        # For this script's simplicity, we'll print and re-raise
-        raise
+import time
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from feature_store import load_user_features
+from ksweep import SILHOUETTE_SAMPLE, sweep
+
 
 def fetch_all_user_metrics(start, end):
     """
     Fetches purchase frequency (purchase_count) and total spending (total_spending)
     for ALL users with at least one purchase within the given date range.
-    Returns a pandas DataFrame.
+    Returns a pandas DataFrame (read from the shared user feature store).
     """
-    # Fetching data for all users with purchases
-    query = text(f"""
-        SELECT
-            user_id,
-            COUNT(*) AS purchase_count,
-            SUM(purchase_price::numeric) AS total_spending
-        FROM customers_full
-        WHERE event_type = 'purchase'
-          AND event_time >= '{start} 00:00:00'
-          AND event_time <= '{end} 23:59:59'
-          AND purchase_price IS NOT NULL
-          AND user_id IS NOT NULL
-        GROUP BY user_id; -- No HAVING clause to get all users with purchases
-    """)
-    engine = get_engine()
     try:
-        df = pd.read_sql_query(query, engine)
+        df = load_user_features(start, end)
         print(f"Fetched metrics for {len(df)} unique users with purchases in the period.")
         return df
-    except SQLAlchemyError as e:
+    except psycopg2.Error as e:
         print(f"Error fetching data from database: {e}")
         raise
 
@@ -89,6 +52,14 @@ def main():
     parser.add_argument('--outdir', default='.', help='Output directory for the elbow plot')
     # Define the range of clusters to test, e.g., from 1 to 10
     parser.add_argument('--k_max', type=int, default=10, help='Maximum number of clusters to test for Elbow Method')
+    parser.add_argument('--strategy', choices=['parallel', 'warm'], default='parallel',
+                        help="Fit every k concurrently, or in sequence seeding k from k-1")
+    parser.add_argument('--minibatch', action='store_true',
+                        help='Use MiniBatchKMeans (for very large numbers of users)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for the parallel strategy (default: all cores)')
+    parser.add_argument('--silhouette_sample', type=int, default=SILHOUETTE_SAMPLE,
+                        help='Users sampled for the silhouette score')
 
     args = parser.parse_args()
 
@@ -113,31 +84,19 @@ def main():
              print("No valid features data after dropping NaNs. Cannot perform Elbow Method.")
              return
 
-        # 2. Scale the features
-        print("Scaling features...")
-        scaler = StandardScaler()
-        scaled_features = scaler.fit_transform(features)
-        print("Features scaled.")
-
-        # 3. Apply K-Means for a range of k values and calculate WCSS
-        print(f"Performing K-Means for k = 1 to {args.k_max}...")
-        wcss = [] # List to store WCSS (Inertia) values
-        # Test k from 1 up to k_max
+        # 2-3. Scale the features once and sweep k = 1..k_max
         k_range = range(1, args.k_max + 1)
-
-        for k in k_range:
-            # Initialize KMeans with n_clusters=k
-            # random_state for reproducibility
-            # n_init='auto' or an integer (e.g., 10) to run algorithm multiple times with different centroids
-            # Changed n_init to 'auto' which is the default in recent sklearn versions, or can use 10
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init='auto', max_iter=300)
-
-            # Fit K-Means to the scaled data
-            kmeans.fit(scaled_features)
-
-            # Append the inertia (WCSS) to the list
-            wcss.append(kmeans.inertia_)
-            print(f"  k={k}: WCSS = {kmeans.inertia_:.2f}")
+        print(f"Performing K-Means for k = 1 to {args.k_max} "
+              f"({args.strategy}{', mini-batch' if args.minibatch else ''})...")
+        t0 = time.perf_counter()
+        results = sweep(features, list(k_range), strategy=args.strategy,
+                        minibatch=args.minibatch, workers=args.workers,
+                        sample_size=args.silhouette_sample)
+        wcss = [r['wcss'] for r in results]
+        for r in results:
+            print(f"  k={r['k']}: WCSS = {r['wcss']:.2f}, "
+                  f"silhouette = {r['silhouette']:.3f}, {r['seconds']:.2f}s")
+        print(f"Sweep finished in {time.perf_counter() - t0:.2f}s.")
 
 
         # 4. Plot the Elbow Curve
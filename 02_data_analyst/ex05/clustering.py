@@ -3,84 +3,166 @@
 """
 Data Viz - Exercise 05: Clustering
 
-– Connects to PostgreSQL using SQLAlchemy and environment variables.
+– Connects to PostgreSQL through the shared pool in src/db_utils.py.
 – Fetches purchase frequency and total spending for ALL users.
 – Scales the frequency and total spending features.
 – Applies K-Means clustering with a chosen number of clusters (e.g., 4).
 – Assigns cluster labels back to the original user data.
 – Analyzes cluster characteristics (average frequency, average monetary value).
-– Assigns user-defined names and colors to clusters based on analysis.
+– Names the clusters by ascending centroid spend (src/segments.py) and saves
+  the fitted scaler and centroids as a versioned model artifact (a new
+  version only when the fit differs from the latest one).
 – Creates graphic representations of the clusters (scatter plot, bar plots of averages)
   with specified names and colors.
 – Saves the plots to the specified output directory.
+
+With --stream, users are never all loaded at once: the features are read in
+batches from a server-side cursor, scaled with StandardScaler.partial_fit,
+clustered with MiniBatchKMeans.partial_fit, and labelled in a final pass
+whose results are COPYed into the user_segments table. The plots then use
+per-cluster sums and a bounded random sample of users.
+
+With --score, no model is trained: users are labelled by nearest centroid
+with the latest saved model (or --model_version).
 """
 
+import io
 import os
+import sys
 import argparse
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
+import psycopg2
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans # Import KMeans
-
-# --- Database connection parameters from environment ---
-DB_PARAMS = {
-    "dbname":    os.getenv("POSTGRES_DB", "piscineds"),
-    "user":      os.getenv("POSTGRES_USER", "bea"),
-    "password":  os.getenv("POSTGRES_PASSWORD", "mysecretpassword"),
-    "host":      os.getenv("DB_HOST", "localhost"),
-    "port":      int(os.getenv("DB_PORT", "5432")),
-}
-
-def get_engine():
-    """Crea un SQLAlchemy engine usando psycopg2."""
-    url = (
-        f"postgresql+psycopg2://{DB_PARAMS['user']}:{DB_PARAMS['password']}"
-        f"@{DB_PARAMS['host']}:{DB_PARAMS['port']}/{DB_PARAMS['dbname']}"
-    )
-    try:
-        engine = create_engine(url)
-        # Attempt to connect to validate credentials/host/port/dbname
-        with engine.connect() as conn:
-            print("Database connection successful!")
-        return engine
-    except SQLAlchemyError as e:
-        print(f"Error connecting to the database: {e}")
-        print(f"Please check database parameters: {DB_PARAMS}")
-        raise
+from sklearn.cluster import KMeans, MiniBatchKMeans # Import KMeans
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from db_utils import pooled_connection
+from feature_store import ensure_features, load_user_features
+from pointcloud import MAX_POINTS, MODES, scatter
+from queries import stream
+from segments import FEATURES, SegmentModel, assign_segments
+
+# Users per server-side cursor batch in --stream mode.
+STREAM_BATCH = 50000
+# Users kept (uniformly at random) for the scatter plot in --stream mode.
+SCATTER_SAMPLE = 20000
+
+SEGMENTS_DDL = """
+CREATE TABLE IF NOT EXISTS user_segments (
+    range_start DATE NOT NULL,
+    range_end   DATE NOT NULL,
+    user_id     BIGINT NOT NULL,
+    cluster     SMALLINT NOT NULL,
+    PRIMARY KEY (range_start, range_end, user_id)
+);
+"""
+
 
 def fetch_all_user_metrics(start, end):
     """
     Fetches purchase frequency (purchase_count) and total spending (total_spending)
     for ALL users with at least one purchase within the given date range.
-    Returns a pandas DataFrame with 'user_id', 'purchase_count', 'total_spending'.
+    Returns a pandas DataFrame with 'user_id', 'purchase_count', 'total_spending'
+    (plus 'recency_days'), read from the shared user feature store.
     """
-    query = text(f"""
-        SELECT
-            user_id,
-            COUNT(*) AS purchase_count,
-            SUM(purchase_price::numeric) AS total_spending
-        FROM customers_full
-        WHERE event_type = 'purchase'
-          AND event_time >= '{start} 00:00:00'
-          AND event_time <= '{end} 23:59:59'
-          AND purchase_price IS NOT NULL
-          AND user_id IS NOT NULL
-        GROUP BY user_id;
-    """)
-    engine = get_engine()
     try:
-        df = pd.read_sql_query(query, engine)
+        df = load_user_features(start, end)
         print(f"Fetched metrics for {len(df)} unique users.")
         return df
-    except SQLAlchemyError as e:
+    except psycopg2.Error as e:
         print(f"Error fetching data from database: {e}")
         raise
 
 
+def _feature_batches(start, end, batch_size):
+    """Yield (user_ids, features) arrays from the feature store, one batch at a time."""
+    range_key = (pd.Timestamp(start).date(), pd.Timestamp(end).date())
+    for rows in stream('user_features', *range_key, None, batch_size=batch_size):
+        user_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        features = np.array([(r[1], float(r[2])) for r in rows], dtype=np.float64)
+        yield user_ids, features
+
+
+def train_streaming(start, end, n_clusters, batch_size=STREAM_BATCH):
+    """
+    Out-of-core training on the users of [start, end] in two streaming passes
+    (StandardScaler.partial_fit, then MiniBatchKMeans.partial_fit on the
+    scaled batches). Returns a SegmentModel.
+    """
+    ensure_features(start, end)
+
+    print("Pass 1/3: fitting the scaler...")
+    scaler = StandardScaler()
+    for _, features in _feature_batches(start, end, batch_size):
+        scaler.partial_fit(features)
+    n_users = int(scaler.n_samples_seen_) if hasattr(scaler, 'n_samples_seen_') else 0
+    if n_users < n_clusters:
+        raise ValueError(f"{n_users} users found, fewer than {n_clusters} clusters")
+
+    print("Pass 2/3: training MiniBatchKMeans...")
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3,
+                             batch_size=min(batch_size, n_users))
+    for _, features in _feature_batches(start, end, batch_size):
+        if len(features) >= n_clusters or hasattr(kmeans, 'cluster_centers_'):
+            kmeans.partial_fit(scaler.transform(features))
+
+    return SegmentModel.from_fit(scaler, kmeans, start=str(start), end=str(end), n_users=n_users)
+
+
+def score_streaming(start, end, model, batch_size=STREAM_BATCH, sample_size=SCATTER_SAMPLE):
+    """
+    Label the users of [start, end] with `model` in one streaming pass and
+    COPY the labels into user_segments.
+
+    Returns (summary, sample_scaled, sample_labels) where summary holds the
+    average purchase_count / total_spending per cluster.
+    """
+    ensure_features(start, end)
+    range_key = (pd.Timestamp(start).date(), pd.Timestamp(end).date())
+
+    print("Pass 3/3: assigning clusters and writing user_segments...")
+    n_clusters = model.n_clusters
+    sums = np.zeros((n_clusters, 2))
+    counts = np.zeros(n_clusters, dtype=np.int64)
+    rng = np.random.default_rng(42)
+    rate = min(1.0, sample_size / max(model.meta.get('n_users', sample_size), 1))
+    sample_scaled, sample_labels = [], []
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SEGMENTS_DDL)
+        cur.execute("DELETE FROM user_segments WHERE range_start = %s AND range_end = %s", range_key)
+        for user_ids, features in _feature_batches(start, end, batch_size):
+            scaled = model.transform(features)
+            labels = model.predict(scaled, scaled=True)
+
+            buf = io.StringIO()
+            pd.DataFrame({
+                'range_start': range_key[0], 'range_end': range_key[1],
+                'user_id': user_ids, 'cluster': labels,
+            }).to_csv(buf, header=False, index=False)
+            buf.seek(0)
+            cur.copy_expert(
+                "COPY user_segments (range_start, range_end, user_id, cluster) "
+                "FROM STDIN WITH (FORMAT csv)", buf)
+
+            np.add.at(sums, labels, features)
+            counts += np.bincount(labels, minlength=n_clusters)
+            keep = rng.random(len(labels)) < rate
+            sample_scaled.append(scaled[keep])
+            sample_labels.append(labels[keep])
+        conn.commit()
+        cur.close()
+    print(f"Assigned cluster labels to {int(counts.sum())} users (saved in user_segments).")
+
+    # Segments without users get NaN averages (no bar) rather than 0.
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary = pd.DataFrame(sums / counts[:, None], columns=['purchase_count', 'total_spending'])
+    summary.index.name = 'cluster'
+    return summary, np.vstack(sample_scaled), np.concatenate(sample_labels)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Exercise 05: Customer Clustering')
     parser.add_argument('--start', default='2022-10-01', help='Start date (YYYY-MM-DD)')
@@ -88,6 +170,18 @@ def main():
     parser.add_argument('--outdir', default='.', help='Output directory for plots')
     # The number of clusters chosen from the Elbow Method analysis (e.g., 4)
     parser.add_argument('--n_clusters', type=int, default=4, help='Number of clusters to use for KMeans')
+    parser.add_argument('--stream', action='store_true',
+                        help='Cluster out of core in batches and store labels in user_segments')
+    parser.add_argument('--batch_size', type=int, default=STREAM_BATCH,
+                        help='Users per batch in --stream mode')
+    parser.add_argument('--score', action='store_true',
+                        help='Label users with a saved segment model instead of retraining')
+    parser.add_argument('--model_version', type=int, default=None,
+                        help='Segment model version used by --score (default: latest)')
+    parser.add_argument('--max_points', type=int, default=MAX_POINTS,
+                        help='Scatter plot markers above which users are sampled or drawn as densities')
+    parser.add_argument('--plot_mode', choices=MODES, default='auto',
+                        help='Scatter rendering: auto, points, sample (stratified) or density')
 
     args = parser.parse_args()
 
@@ -95,68 +189,85 @@ def main():
     os.makedirs(args.outdir, exist_ok=True)
 
     try:
-        # 1. Data Preparation: Fetch data
-        df_metrics = fetch_all_user_metrics(args.start, args.end)
-
-        if df_metrics.empty:
-            print("No user metrics data found. Cannot perform clustering.")
-            return
-
-        # Select features for clustering (Frequency and Monetary Value)
-        features = df_metrics[['purchase_count', 'total_spending']]
-
-        # Handle potential NaNs or infinite values
-        features = features.dropna()
-        if features.empty:
-             print("No valid features data after dropping NaNs. Cannot perform clustering.")
-             return
-
-        # Data Preparation: Scale features
-        print("Scaling features...")
-        scaler = StandardScaler()
-        scaled_features = scaler.fit_transform(features)
-        print("Features scaled.")
-
-        # 2. & 3. Choose and Apply K-Means Clustering
         n_clusters = args.n_clusters # Use the number of clusters specified or default (4)
-        print(f"Applying K-Means clustering with {n_clusters} clusters...")
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init='auto', max_iter=300)
-
-        # Fit K-Means to the scaled data
-        kmeans.fit(scaled_features)
-        print("K-Means clustering complete.")
-
-        # 4. Assign Clusters to Users
-        cluster_labels = kmeans.labels_
-
-        df_clustered = df_metrics.copy() # Work on a copy
-        df_clustered = df_clustered.loc[features.index].copy() # Ensure index alignment after dropna
-        df_clustered['cluster'] = cluster_labels
-
-
-        print(f"Assigned cluster labels to {len(df_clustered)} users.")
-
+        df_clustered = None
+
+        if args.score:
+            model = SegmentModel.load(args.model_version)
+            print(f"Scoring with segment model v{model.version} ({model.n_clusters} clusters).")
+        else:
+            model = None
+
+        if args.stream:
+            # 1.-4. Streaming passes: only one batch of users in memory at a time
+            if model is None:
+                model = train_streaming(args.start, args.end, n_clusters, batch_size=args.batch_size)
+            cluster_summary_original, scaled_features, cluster_labels = score_streaming(
+                args.start, args.end, model, batch_size=args.batch_size)
+        else:
+            # 1. Data Preparation: Fetch data
+            df_metrics = fetch_all_user_metrics(args.start, args.end)
+
+            if df_metrics.empty:
+                print("No user metrics data found. Cannot perform clustering.")
+                return
+
+            # Select features for clustering (Frequency and Monetary Value)
+            features = df_metrics[list(FEATURES)]
+
+            # Handle potential NaNs or infinite values
+            features = features.dropna()
+            if features.empty:
+                 print("No valid features data after dropping NaNs. Cannot perform clustering.")
+                 return
+
+            if model is None:
+                # Data Preparation: Scale features
+                print("Scaling features...")
+                scaler = StandardScaler()
+                scaled_features = scaler.fit_transform(features)
+                print("Features scaled.")
+
+                # 2. & 3. Choose and Apply K-Means Clustering
+                print(f"Applying K-Means clustering with {n_clusters} clusters...")
+                kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init='auto', max_iter=300)
+
+                # Fit K-Means to the scaled data
+                kmeans.fit(scaled_features)
+                print("K-Means clustering complete.")
+                model = SegmentModel.from_fit(scaler, kmeans, start=args.start, end=args.end,
+                                              n_users=len(features))
+            else:
+                scaled_features = model.transform(features)
+
+            # 4. Assign Clusters to Users (nearest centroid, clusters ordered by spend)
+            df_clustered = assign_segments(df_metrics.loc[features.index], model)
+            cluster_labels = df_clustered['cluster'].to_numpy()
+            print(f"Assigned cluster labels to {len(df_clustered)} users.")
+
+            # Calculate average original feature values per cluster
+            cluster_summary_original = df_clustered.groupby('cluster')[['purchase_count', 'total_spending']].mean()
+
+        if not args.score:
+            # An unchanged fit keeps the latest version instead of adding one.
+            model_path = model.save()
+            print(f"Segment model v{model.version}: {model_path}")
+        n_clusters = model.n_clusters
+        # A segment no user falls into (possible with --score) still gets its
+        # row, so every bar chart has one tick per segment.
+        cluster_summary_original = cluster_summary_original.reindex(
+            pd.RangeIndex(n_clusters, name='cluster'))
 
         # 5. Interpret and Characterize Clusters
         print("\nAnalyzing cluster characteristics...")
 
-        # Calculate average original feature values per cluster
-        cluster_summary_original = df_clustered.groupby('cluster')[['purchase_count', 'total_spending']].mean()
-
-        print("\nAverage Original Feature Values per Cluster (Analyze this to map indices to names):")
+        print("\nAverage Original Feature Values per Cluster (ordered by spend):")
         print(cluster_summary_original)
 
         # --- Assign Names and Colors ---
-        # BASED ON YOUR ANALYSIS OF cluster_summary_original, map cluster indices (0, 1, 2, 3)
-        # to your chosen descriptive names.
-        # THIS MAPPING IS BASED ON YOUR HYPOTHETICAL ANALYSIS. VERIFY WITH YOUR DATA!
-        cluster_names_map = {
-             2: 'Inactive Customers',
-             0: 'Standard Customers',
-             3: 'Silver Customers',
-             1: 'Gold Customers',
-             # Ensure you have a mapping for ALL cluster indices (0, 1, ..., n_clusters-1)
-        }
+        # Cluster indices are ordered by centroid spend, so the names from the
+        # model stay attached to the same kind of customer across fits.
+        cluster_names_map = dict(enumerate(model.names))
 
         # Define the color map from your chosen names to specific colors
         cluster_colors_map = {
@@ -165,39 +276,44 @@ def main():
             'Silver Customers': 'gray',
             'Gold Customers': 'gold', 
         }
+        # Generic 'Segment i' names (n_clusters != 4) get default colors
+        for i, name in enumerate(model.names):
+            cluster_colors_map.setdefault(name, f'C{i}')
+
+        # Descriptive cluster name of every plotted user
+        point_names = pd.Series(cluster_labels).map(cluster_names_map)
 
-        # Add the descriptive cluster names to the DataFrame
-        df_clustered['cluster_name'] = df_clustered['cluster'].map(cluster_names_map)
+        if df_clustered is not None:
+            # Add the descriptive cluster names to the DataFrame
+            df_clustered['cluster_name'] = df_clustered['segment']
 
-        print("\nExample of users with assigned cluster names:")
-        # Display sorted by cluster name for better readability
-        print(df_clustered[['user_id', 'purchase_count', 'total_spending', 'cluster', 'cluster_name']].sort_values('cluster_name').head())
+            print("\nExample of users with assigned cluster names:")
+            # Display sorted by cluster name for better readability
+            print(df_clustered[['user_id', 'purchase_count', 'total_spending', 'cluster', 'cluster_name']].sort_values('cluster_name').head())
 
 
         # --- 6. Create Graphic Representations (Minimum 2 required) ---
         print("\nGenerating graphic representations...")
 # Plot 1: Scatter plot of scaled features colored by cluster name
         plt.figure(figsize=(10, 8))
-        # Use the cluster_name for hue and the cluster_colors_map for palette
-        sns.scatterplot(
-            x=scaled_features[:, 0], # Scaled Purchase Count
-            y=scaled_features[:, 1], # Scaled Total Spending
-            hue=df_clustered['cluster_name'], # Color by cluster name
-            palette=cluster_colors_map, # Use the custom color map
+        # Use the cluster_name for classes and the cluster_colors_map for colors;
+        # large user bases are sampled per cluster or drawn as densities
+        scatter(
+            plt.gca(), # Use current axes
+            scaled_features[:, 0], # Scaled Purchase Count
+            scaled_features[:, 1], # Scaled Total Spending
+            labels=point_names, # Color by cluster name
+            colors=cluster_colors_map, # Use the custom color map
+            mode=args.plot_mode,
+            max_points=args.max_points,
             s=50, # Marker size for data points
             alpha=0.6, # Transparency for data points
-            ax=plt.gca() # Use current axes
         )
         # Plot cluster centroids with more striking style
-        # Need to get the names in the order of centroids for legend/labels if plotting names
-        # For simplicity, plot centroids as generic 'Centroid' for now, colored by index palette
-        # Or calculate centroid positions for each named cluster:
-        centroid_names = [cluster_names_map.get(i, f'Cluster {i}') for i in sorted(cluster_names_map.keys())]
-        # Get colors for centroids - could use a different palette or single striking color
-        # Let's use a single striking color and larger size
+        # Use a single striking color and larger size
         plt.scatter(
-             kmeans.cluster_centers_[sorted(cluster_names_map.keys()), 0], # X-coords based on sorted indices in map
-             kmeans.cluster_centers_[sorted(cluster_names_map.keys()), 1], # Y-coords based on sorted indices in map
+             model.centers[:, 0], # X-coords (scaled), in cluster index order
+             model.centers[:, 1], # Y-coords (scaled), in cluster index order
              s=300, # <-- Increased Size of centroid markers
              c='magenta', # <-- Changed color to magenta
              marker='X', # Marker style for centroids
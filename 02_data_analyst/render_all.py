@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data Viz - render-all: render every analyst chart in one run.
+
+– Imports matplotlib (Agg backend, never shown), pandas, seaborn, sklearn and
+  the exercise scripts once in the parent process; pool workers are forked
+  from it and reuse those modules instead of paying the import cost again.
+– Prepares the shared data layer once (the user_features range used by
+  building.py, elbow.py and clustering.py) so workers only read it.
+– Runs each script's main() in a process pool, one chart job per script;
+  each worker opens its own pooled database connections.
+– Skips a chart when the fingerprint of its inputs (script source, the src/
+  modules it imports, arguments and the signature of the tables or CSV files
+  it reads) is unchanged since its last successful render and all its
+  outputs still exist.
+
+Each job's output goes to <outdir>/logs/<chart>.log; fingerprints are kept
+in <outdir>/.render_state.json.
+"""
+
+import os
+import ast
+import sys
+import time
+import json
+import hashlib
+import argparse
+import importlib.util
+import multiprocessing
+import traceback
+import warnings
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import psycopg2
+from threadpoolctl import threadpool_limits
+# Heavy libraries imported once here; forked workers inherit them.
+import numpy  # noqa: F401
+import pandas  # noqa: F401
+import seaborn  # noqa: F401
+import sklearn.cluster  # noqa: F401
+import sklearn.preprocessing  # noqa: F401
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.normpath(os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, SRC)
+from db_utils import pooled_connection, table_signature
+from feature_store import ensure_features
+
+STATE_FILE = '.render_state.json'
+DEFAULT_INPUT_FOLDER = os.environ.get(
+    'CUSTOMER_CSV_DIR', os.path.join(HERE, '..', 'data', 'customer'))
+
+# script: path relative to this folder; inputs: tables it reads ('csv' for
+# the customer CSV folder); outputs: files that must exist after a render;
+# features: needs the shared user_features range.
+CHARTS = {
+    'pie': dict(script='ex00/pie.py', inputs=['csv'], outputs=['pie_chart.png']),
+    'chart': dict(script='ex01/chart.py', inputs=['customers'],
+                  outputs=['daily_customers.png', 'monthly_sales.png',
+                           'avg_spend_per_customer.png']),
+    'mustache': dict(script='ex02/mustache.py', inputs=['customers_full'],
+                     outputs=['mustache_overall.png', 'mustache_common.png']),
+    'building': dict(script='ex03/building.py', inputs=['customers_full'],
+                     outputs=['building_histograms.png'], features=True),
+    'elbow': dict(script='ex04/elbow.py', inputs=['customers_full'],
+                  outputs=['elbow.png'], features=True),
+    'clustering': dict(script='ex05/clustering.py', inputs=['customers_full'],
+                       outputs=['Clustering_scatter_scaled.png', 'Clustering_avg_frequency.png',
+                                'Clustering_avg_monetary.png'], features=True),
+}
+
+# Exercise modules loaded in the parent, inherited by forked workers.
+_modules = {}
+
+
+def chart_args(name, args):
+    """Command-line arguments passed to the chart script's main()."""
+    if name == 'pie':
+        return ['--input_folder', args.input_folder,
+                '--output', os.path.join(args.outdir, 'pie_chart.png')]
+    argv = ['--outdir', args.outdir]
+    if name != 'chart':
+        argv += ['--start', args.start, '--end', args.end]
+    if name == 'elbow':
+        # Sequential warm-started sweep: the pool already uses every core.
+        argv += ['--strategy', 'warm']
+    return argv
+
+
+def load_script(name):
+    """Import an exercise script as a module (once per process)."""
+    if name not in _modules:
+        path = os.path.join(HERE, CHARTS[name]['script'])
+        spec = importlib.util.spec_from_file_location(f'render_{name}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+def _csv_signature(folder):
+    """Name, size and mtime of every customer CSV (a stat each, no hashing)."""
+    try:
+        files = load_script('pie').list_files(folder)
+    except FileNotFoundError:
+        return None
+    return [(os.path.basename(f), os.stat(f).st_size, os.stat(f).st_mtime) for f in files]
+
+
+def input_signatures(names, args):
+    """Signature of every input read by the selected charts."""
+    tables = sorted({t for n in names for t in CHARTS[n]['inputs'] if t != 'csv'})
+    signatures = {}
+    if tables:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            for table in tables:
+                signatures[table] = table_signature(cur, table)
+            cur.close()
+    if any('csv' in CHARTS[n]['inputs'] for n in names):
+        signatures['csv'] = _csv_signature(args.input_folder)
+    return signatures
+
+
+def source_files(path):
+    """`path` and every src/ module it imports, directly or through other src/ modules."""
+    files, todo = [], [path]
+    while todo:
+        path = todo.pop()
+        if path in files:
+            continue
+        files.append(path)
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for module in names:
+                candidate = os.path.join(SRC, module.split('.')[0] + '.py')
+                if os.path.exists(candidate):
+                    todo.append(candidate)
+    return sorted(files)
+
+
+def fingerprint(name, argv, signatures):
+    h = hashlib.sha256()
+    for path in source_files(os.path.join(HERE, CHARTS[name]['script'])):
+        h.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    h.update(json.dumps([argv, [signatures.get(t) for t in CHARTS[name]['inputs']]],
+                        default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def read_state(outdir):
+    try:
+        with open(os.path.join(outdir, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_state(outdir, state):
+    path = os.path.join(outdir, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _init_worker(threads):
+    threadpool_limits(threads)
+    warnings.filterwarnings('ignore', message='.*non-interactive.*')
+
+
+def render(name, argv, outdir):
+    """
+    Run one chart script's main() with `argv`, logging its output.
+    Returns (name, ok, seconds); ok requires every output to be rewritten.
+    """
+    module = load_script(name)
+    log_path = os.path.join(outdir, 'logs', f'{name}.log')
+    start = time.time()
+    ok = True
+    saved_argv = sys.argv
+    with open(log_path, 'w', encoding='utf-8') as log, redirect_stdout(log), redirect_stderr(log):
+        sys.argv = [CHARTS[name]['script']] + argv
+        try:
+            module.main()
+        except SystemExit as e:
+            ok = not e.code
+        except Exception:
+            traceback.print_exc()
+            ok = False
+        finally:
+            sys.argv = saved_argv
+            plt.close('all')
+    for output in CHARTS[name]['outputs']:
+        path = os.path.join(outdir, output)
+        if not os.path.exists(path) or os.path.getmtime(path) < start - 1:
+            ok = False
+    return name, ok, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render all analyst charts in one process pool')
+    parser.add_argument('--outdir', default='charts', help='Output directory for every chart')
+    parser.add_argument('--start', default='2022-10-01', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end', default='2023-02-28', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--input_folder', default=DEFAULT_INPUT_FOLDER,
+                        help='Folder with the customer CSVs (pie chart)')
+    parser.add_argument('--only', nargs='+', choices=list(CHARTS), default=list(CHARTS),
+                        help='Render only these charts')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true',
+                        help='Render even when the inputs are unchanged')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.outdir, 'logs'), exist_ok=True)
+    for name in args.only:
+        load_script(name)
+
+    # 1. Decide what needs rendering
+    try:
+        signatures = input_signatures(args.only, args)
+    except psycopg2.Error as e:
+        print(f"Cannot read the input signatures from the database: {e}")
+        sys.exit(1)
+    state = read_state(args.outdir)
+    jobs = {}
+    for name in args.only:
+        argv = chart_args(name, args)
+        key = fingerprint(name, argv, signatures)
+        outputs_exist = all(os.path.exists(os.path.join(args.outdir, o))
+                            for o in CHARTS[name]['outputs'])
+        if not args.force and outputs_exist and state.get(name, {}).get('fingerprint') == key:
+            print(f"  {name:<11} unchanged, skipped")
+            continue
+        jobs[name] = (argv, key)
+    if not jobs:
+        print("All charts are up to date.")
+        return
+
+    # 2. Shared data layer: build the user_features range once, before forking
+    if any(CHARTS[name].get('features') for name in jobs):
+        print(f"Preparing user features for {args.start} .. {args.end}...")
+        ensure_features(args.start, args.end)
+
+    # 3. Render in parallel
+    workers = min(args.workers or os.cpu_count() or 1, len(jobs))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    print(f"Rendering {len(jobs)} chart(s) with {workers} worker(s)...")
+    t0 = time.perf_counter()
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = [pool.submit(render, name, argv, args.outdir) for name, (argv, _) in jobs.items()]
+        for future in as_completed(futures):
+            name, ok, seconds = future.result()
+            if ok:
+                state[name] = {'fingerprint': jobs[name][1],
+                               'rendered_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+                write_state(args.outdir, state)
+                print(f"  {name:<11} rendered in {seconds:.1f}s")
+            else:
+                failed.append(name)
+                print(f"  {name:<11} FAILED after {seconds:.1f}s "
+                      f"(see {os.path.join(args.outdir, 'logs', name + '.log')})")
+    print(f"Done in {time.perf_counter() - t0:.1f}s: "
+          f"{len(jobs) - len(failed)} rendered, {len(args.only) - len(jobs)} skipped, "
+          f"{len(failed)} failed.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
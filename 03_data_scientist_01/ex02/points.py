@@ -5,6 +5,9 @@ import matplotlib.pyplot as plt
 from pathlib import Path
 import sys
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+from pointcloud import scatter  # markers, or sampling/densities for large sets
+
 def find_csv_dir():
     """
     Search for the directory containing Train_knight.csv and Test_knight.csv:
@@ -85,8 +88,8 @@ def plot_jedi_info(df_test: pd.DataFrame):
     """
     # Stims vs. Empowered
     plt.figure()
-    plt.scatter(
-        df_test['empowered'], df_test['stims'],
+    scatter(
+        plt.gca(), df_test['empowered'], df_test['stims'],
         alpha=0.4, color='green', label='Knight'
     )
     plt.xlabel('Empowered')
@@ -97,8 +100,8 @@ def plot_jedi_info(df_test: pd.DataFrame):
 
     # Deflection vs. Push
     plt.figure()
-    plt.scatter(
-        df_test['push'], df_test['deflection'],
+    scatter(
+        plt.gca(), df_test['push'], df_test['deflection'],
         alpha=0.4, color='green', label='Knight'
     )
     plt.xlabel('Push')
@@ -130,6 +133,8 @@ def plot_knight_info(df_train: pd.DataFrame):
     df_train['knight'] = df_train['knight'].astype(str).str.strip().str.lower()
     jedi = df_train[df_train['knight'] == 'jedi']
     sith = df_train[df_train['knight'] == 'sith']
+    classes = df_train['knight'].map({'jedi': 'Jedi', 'sith': 'Sith'})
+    colors = {'Jedi': 'blue', 'Sith': 'red'}
 
     if jedi.empty or sith.empty:
         print(
@@ -139,8 +144,8 @@ def plot_knight_info(df_train: pd.DataFrame):
 
     # Stims vs. Empowered by class
     plt.figure()
-    plt.scatter(jedi['empowered'], jedi['stims'], alpha=0.4, color='blue', label='Jedi')
-    plt.scatter(sith['empowered'], sith['stims'], alpha=0.4, color='red',  label='Sith')
+    scatter(plt.gca(), df_train['empowered'], df_train['stims'],
+            labels=classes, colors=colors, alpha=0.4)
     plt.xlabel('Empowered')
     plt.ylabel('Stims')
     plt.legend()
@@ -149,8 +154,8 @@ def plot_knight_info(df_train: pd.DataFrame):
 
     # Deflection vs. Push by class
     plt.figure()
-    plt.scatter(jedi['push'], jedi['deflection'], alpha=0.4, color='blue', label='Jedi')
-    plt.scatter(sith['push'], sith['deflection'], alpha=0.4, color='red',  label='Sith')
+    scatter(plt.gca(), df_train['push'], df_train['deflection'],
+            labels=classes, colors=colors, alpha=0.4)
     plt.xlabel('Push')
     plt.ylabel('Deflection')
     plt.legend()
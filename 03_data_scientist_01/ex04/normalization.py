@@ -6,6 +6,9 @@ from pathlib import Path
 import pandas as pd
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+from pointcloud import scatter  # markers, or sampling/densities for large sets
+
 # ─── Feature list ───────────────────────────────────────────────────────────────
 FEATURES = [
     "Sensitivity","Hability","Strength","Power","Agility","Dexterity",
@@ -55,13 +58,11 @@ def minmax(train, df):
 def scatter_save(df, x, y, out_path, by_class):
     plt.figure(figsize=(6,4))
     if by_class:
-        for cls,color in ((1,"blue"),(0,"red")):
-            sub = df[df["knight"]==cls]
-            plt.scatter(sub[x], sub[y], c=color, alpha=0.6,
-                        label="Jedi" if cls==1 else "Sith")
+        scatter(plt.gca(), df[x], df[y], labels=df["knight"].map({1:"Jedi",0:"Sith"}),
+                colors={"Jedi":"blue","Sith":"red"}, alpha=0.6)
         plt.legend(title="Class")
     else:
-        plt.scatter(df[x], df[y], c="green", alpha=0.6, label="All")
+        scatter(plt.gca(), df[x], df[y], color="green", alpha=0.6, label="All")
         plt.legend()
     plt.xlabel(f"{x} (normalized)")
     plt.ylabel(f"{y} (normalized)")
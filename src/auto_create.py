@@ -1,14 +1,25 @@
 import glob
 import os
-from db_utils import get_connection
-from create_table import create_table_from_csv
+import argparse
+from create_table import load_csv_files, CHUNK_SIZE
 
 def main():
-    conn = get_connection(dbname='piscineds')
-    for csv_file in glob.glob(os.path.join('customer','*.csv')):
-        tbl = os.path.splitext(os.path.basename(csv_file))[0]
-        create_table_from_csv(conn, csv_file, tbl)
-    conn.close()
+    parser = argparse.ArgumentParser(description='Load every CSV of the given folders into PostgreSQL.')
+    parser.add_argument('--folders', nargs='+', default=['customer'],
+                        help='Folders whose CSVs are loaded (one table per file)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of files loaded in parallel (1 = sequential)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream each CSV to COPY in chunks instead of loading it in memory')
+    parser.add_argument('--force', action='store_true',
+                        help='Reload every file, ignoring the load manifest')
+    args = parser.parse_args()
+
+    csv_files = []
+    for folder in args.folders:
+        csv_files.extend(glob.glob(os.path.join(folder, '*.csv')))
+    load_csv_files(csv_files, workers=args.workers, stream=args.stream,
+                   chunk_size=CHUNK_SIZE, incremental=not args.force)
 
 if __name__ == '__main__':
     main()
@@ -1,35 +1,117 @@
 import os
+import time
 import argparse
 import pandas as pd
+import psycopg2
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from io import StringIO
 from db_utils import get_connection
+import manifest
+import schema
 
-def infer_sql_dtype(dtype, series):
-    if pd.api.types.is_datetime64_any_dtype(dtype):
-        return 'TIMESTAMP'
-    elif pd.api.types.is_integer_dtype(dtype):
-        return 'INTEGER'
-    elif pd.api.types.is_float_dtype(dtype):
-        return 'REAL'
-    elif pd.api.types.is_bool_dtype(dtype):
-        return 'BOOLEAN'
-    else:
-        max_len = series.astype(str).map(len).max()
-        if max_len and max_len < 256:
-            return f'VARCHAR({max_len})'
-        return 'TEXT'
-
-def create_table_from_csv(conn, csv_path, table_name):
-    df = pd.read_csv(csv_path, parse_dates=[0], infer_datetime_format=True)
-    columns = df.columns.tolist()
-    dtypes = df.dtypes
-    sql_types = [infer_sql_dtype(dtypes[col], df[col]) for col in columns]
+# Bytes handed to COPY per read() in streaming mode.
+CHUNK_SIZE = 1 << 20
 
-    cur = conn.cursor()
+class ChunkedReader:
+    """
+    File-like adapter that feeds COPY ... FROM STDIN in fixed-size chunks,
+    so only one chunk of the CSV is held in memory at a time.
+    """
+
+    def __init__(self, fileobj, chunk_size=CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(self.chunk_size)
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self, size=-1):
+        line = self.fileobj.readline()
+        self.bytes_read += len(line)
+        return line
+
+def detach_partition(cur, table_name):
+    """
+    Detach `table_name` from its partitioned parent (e.g. a month attached to
+    customers). Returns (parent, bound clause) to re-attach it with, or None
+    when it is not a partition.
+    """
+    cur.execute("""
+        SELECT i.inhparent::regclass::text, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_class c
+        JOIN pg_inherits i ON i.inhrelid = c.oid
+        WHERE c.oid = to_regclass(%s) AND c.relispartition
+    """, (f'"{table_name}"',))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    parent, bound = row
+    cur.execute(f'ALTER TABLE {parent} DETACH PARTITION "{table_name}";')
+    return parent, bound
+
+def reattach_partition(cur, table_name, partition):
+    """
+    Re-attach a reloaded table with the bounds detach_partition() returned.
+    A table whose new column types or rows no longer fit stays detached (it
+    is reported, and partitions.py copies it in on its next sync).
+    """
+    parent, bound = partition
+    cur.execute("SAVEPOINT reattach_partition")
+    try:
+        cur.execute(f'ALTER TABLE {parent} ATTACH PARTITION "{table_name}" {bound};')
+    except (psycopg2.errors.DatatypeMismatch, psycopg2.errors.CheckViolation) as e:
+        cur.execute("ROLLBACK TO SAVEPOINT reattach_partition")
+        print(f"Table '{table_name}' could not be re-attached to {parent} "
+              f"({e.pgerror.strip()}); run partitions.py to copy it in.")
+        return False
+    cur.execute("RELEASE SAVEPOINT reattach_partition")
+    return True
+
+def create_table(cur, table_name, columns, sql_types):
+    """
+    Drop and recreate `table_name` with the given columns and SQL types. A
+    table that is a partition is detached first; the (parent, bound) to pass
+    to reattach_partition() once it is loaded is returned (None otherwise).
+    """
+    partition = detach_partition(cur, table_name)
     cur.execute(f'DROP TABLE IF EXISTS "{table_name}";')
     col_defs = [f'"{col}" {sql_type}' for col, sql_type in zip(columns, sql_types)]
     create_stmt = f'CREATE TABLE "{table_name}" (\n  ' + ',\n  '.join(col_defs) + '\n);'
     cur.execute(create_stmt)
+    return partition
+
+def prepare_schema(conn, csv_path):
+    """
+    Infer the column statistics of a CSV with a full streaming pass and make
+    sure the enum types it needs exist (this commits on `conn`).
+    """
+    stats = schema.infer_schema(csv_path)
+    schema.ensure_enum_types(conn, schema.merge_enum_values([stats]))
+    return stats
+
+def create_table_from_csv(conn, csv_path, table_name, stream=False, chunk_size=CHUNK_SIZE,
+                          commit=True, stats=None):
+    """
+    (Re)create `table_name` from a CSV. `stats` is the list of ColumnStats from
+    schema.infer_schema(); when omitted it is computed here via prepare_schema().
+    """
+    if stats is None:
+        stats = prepare_schema(conn, csv_path)
+    columns = [col.name for col in stats]
+    sql_types = [col.sql_type() for col in stats]
+
+    if stream:
+        return stream_table_from_csv(conn, csv_path, table_name, columns, sql_types,
+                                     chunk_size=chunk_size, commit=commit)
+
+    # Values are kept as the original text so they match the inferred types.
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False, na_values=[''])
+
+    cur = conn.cursor()
+    partition = create_table(cur, table_name, columns, sql_types)
 
     buf = StringIO()
     df.to_csv(buf, index=False, header=False)
@@ -37,29 +119,188 @@ def create_table_from_csv(conn, csv_path, table_name):
     cols_list = ', '.join([f'"{c}"' for c in columns])
     copy_stmt = f'COPY "{table_name}" ({cols_list}) FROM STDIN WITH CSV'
     cur.copy_expert(copy_stmt, buf)
-    conn.commit()
+    if partition is not None:
+        reattach_partition(cur, table_name, partition)
+    if commit:
+        conn.commit()
     cur.close()
     print(f"Table '{table_name}' created and data loaded.")
 
+def stream_table_from_csv(conn, csv_path, table_name, columns, sql_types,
+                          chunk_size=CHUNK_SIZE, commit=True):
+    """
+    Streaming variant of create_table_from_csv: the raw file is piped to COPY
+    in `chunk_size` byte chunks, so peak memory does not depend on file size.
+    """
+    cur = conn.cursor()
+    partition = create_table(cur, table_name, columns, sql_types)
+
+    cols_list = ', '.join([f'"{c}"' for c in columns])
+    copy_stmt = f'COPY "{table_name}" ({cols_list}) FROM STDIN WITH (FORMAT csv, HEADER true)'
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = ChunkedReader(f, chunk_size)
+        cur.copy_expert(copy_stmt, reader, size=chunk_size)
+    if partition is not None:
+        reattach_partition(cur, table_name, partition)
+    if commit:
+        conn.commit()
+    cur.close()
+    print(f"Table '{table_name}' created and data streamed ({reader.bytes_read} bytes).")
+
+def _inspect_one(csv_path, table_name, incremental=False):
+    """
+    Pool worker: decide whether a CSV needs loading and, if so, infer its schema.
+    Returns (fingerprint or None, stats or None); stats is None when unchanged.
+    """
+    fingerprint = None
+    if incremental:
+        conn = get_connection(dbname='piscineds')
+        try:
+            changed, fingerprint = manifest.check_source(conn.cursor(), csv_path, table_name)
+            conn.commit()  # keeps a refreshed size/mtime of an identical file
+        finally:
+            conn.close()
+        if not changed:
+            return fingerprint, None
+    return fingerprint, schema.infer_schema(csv_path)
+
+def _load_one(csv_path, table_name, stats, fingerprint, stream, chunk_size):
+    """
+    Pool worker: load one CSV on its own connection.
+
+    The table rebuild and (with a manifest `fingerprint`) the manifest update
+    run in a single transaction, so a failed load leaves the previous table
+    intact. Returns elapsed seconds.
+    """
+    start = time.perf_counter()
+    conn = get_connection(dbname='piscineds')
+    try:
+        create_table_from_csv(conn, csv_path, table_name, stream=stream,
+                              chunk_size=chunk_size, commit=False, stats=stats)
+        if fingerprint is not None:
+            cur = conn.cursor()
+            manifest.record_load(cur, fingerprint, table_name)
+            cur.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+def _run_jobs(fn, jobs, workers, on_result):
+    """
+    Run fn(*args) for every (key, args) in `jobs`, `workers` at a time, calling
+    on_result(key, result) as each finishes. The first failure cancels pending
+    jobs and is re-raised.
+    """
+    if workers <= 1:
+        for key, args in jobs:
+            on_result(key, fn(*args))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = {pool.submit(fn, *args): key for key, args in jobs}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error processing {key}: {e}. Cancelling remaining jobs.")
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+            on_result(key, result)
+
+def load_csv_files(csv_paths, workers=1, stream=False, chunk_size=CHUNK_SIZE,
+                   incremental=False):
+    """
+    Load each CSV into a table named after the file, `workers` files at a time.
+
+    Loading runs in two pooled phases: every file is first scanned once to
+    infer its schema (enum types shared across files are then created in one
+    go), and then loaded. Every worker uses its own connection and commits per
+    file. Files are scheduled largest first so the total time tracks the
+    biggest file. On the first failure pending jobs are cancelled and the
+    error re-raised; tables already committed are left in place.
+
+    With `incremental`, files whose size/mtime/hash match the load manifest
+    are skipped and only new or changed files are reloaded.
+    """
+    paths = sorted(csv_paths, key=os.path.getsize, reverse=True)
+    total = len(paths)
+    if not paths:
+        print("No CSV files to load.")
+        return
+
+    def table_for(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    conn = get_connection(dbname='piscineds')
+    if incremental:
+        manifest.ensure_manifest(conn)
+
+    # Phase 1: manifest check + schema inference.
+    inspected = {}
+    def on_inspected(path, result):
+        inspected[path] = result
+        if result[1] is None:
+            print(f"[{len(inspected)}/{total}] {table_for(path)} unchanged, skipped")
+        else:
+            print(f"[{len(inspected)}/{total}] {table_for(path)} schema inferred")
+
+    _run_jobs(_inspect_one,
+              [(path, (path, table_for(path), incremental)) for path in paths],
+              workers, on_inspected)
+
+    pending = [path for path in paths if inspected[path][1] is not None]
+    schema.ensure_enum_types(
+        conn, schema.merge_enum_values([inspected[path][1] for path in pending])
+    )
+    conn.close()
+
+    # Phase 2: load the new or changed files.
+    loaded = []
+    def on_loaded(path, elapsed):
+        loaded.append(path)
+        print(f"[{len(loaded)}/{len(pending)}] {table_for(path)} loaded in {elapsed:.1f}s")
+
+    jobs = [
+        (path, (path, table_for(path), inspected[path][1], inspected[path][0],
+                stream, chunk_size))
+        for path in pending
+    ]
+    if jobs:
+        _run_jobs(_load_one, jobs, workers, on_loaded)
+
 def main():
     parser = argparse.ArgumentParser(description='Create PostgreSQL tables from CSV.')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--folder', help='Carpeta con CSVs')
     group.add_argument('--file', help='Un único CSV')
     parser.add_argument('--table', help='Nombre de tabla si usas --file')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream the CSV to COPY in chunks instead of loading it in memory')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Bytes per COPY chunk in --stream mode')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of files loaded in parallel with --folder')
+    parser.add_argument('--incremental', action='store_true',
+                        help='With --folder, skip files unchanged since the last load')
     args = parser.parse_args()
 
-    conn = get_connection(dbname='piscineds')
     if args.folder:
-        for fname in os.listdir(args.folder):
-            if fname.lower().endswith('.csv'):
-                path = os.path.join(args.folder, fname)
-                tbl = os.path.splitext(fname)[0]
-                create_table_from_csv(conn, path, tbl)
-    else:
-        if not args.table:
-            parser.error('--table es obligatorio con --file')
-        create_table_from_csv(conn, args.file, args.table)
+        paths = [os.path.join(args.folder, fname) for fname in os.listdir(args.folder)
+                 if fname.lower().endswith('.csv')]
+        load_csv_files(paths, workers=args.workers, stream=args.stream,
+                       chunk_size=args.chunk_size, incremental=args.incremental)
+        return
+
+    if not args.table:
+        parser.error('--table es obligatorio con --file')
+    conn = get_connection(dbname='piscineds')
+    create_table_from_csv(conn, args.file, args.table,
+                          stream=args.stream, chunk_size=args.chunk_size)
     conn.close()
 
 if __name__ == '__main__':
@@ -1,16 +1,123 @@
 import os
+import threading
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import pool
 
-def get_connection(dbname=None):
-    user = os.getenv('POSTGRES_USER') or os.getenv('USER')
-    password = os.getenv('POSTGRES_PASSWORD')
-    host = os.getenv('DB_HOST', 'db')
-    port = int(os.getenv('DB_PORT', 5432))
-    database = dbname or os.getenv('POSTGRES_DB', 'piscineds')
-    return psycopg2.connect(
-        dbname=database,
-        user=user,
-        password=password,
-        host=host,
-        port=port
+# Connections kept by the process-wide pools.
+POOL_MAX_CONN = int(os.getenv('DB_POOL_MAX', 8))
+
+_lock = threading.Lock()
+_pools = {}
+_engines = {}
+
+def db_params(dbname=None):
+    """Connection parameters from the environment (shared by every entry point)."""
+    return dict(
+        dbname=dbname or os.getenv('POSTGRES_DB', 'piscineds'),
+        user=os.getenv('POSTGRES_USER') or os.getenv('USER'),
+        password=os.getenv('POSTGRES_PASSWORD'),
+        host=os.getenv('DB_HOST', 'db'),
+        port=int(os.getenv('DB_PORT', 5432)),
     )
+
+def get_connection(dbname=None):
+    """Open a new, unpooled connection (the caller closes it)."""
+    return psycopg2.connect(**db_params(dbname))
+
+def _cache_key(dbname):
+    # Keyed by pid so forked workers never reuse the parent's sockets.
+    return (os.getpid(), db_params(dbname)['dbname'])
+
+def get_pool(dbname=None):
+    """Process-wide psycopg2 connection pool, created on first use."""
+    key = _cache_key(dbname)
+    with _lock:
+        if key not in _pools:
+            _pools[key] = pool.ThreadedConnectionPool(1, POOL_MAX_CONN, **db_params(dbname))
+        return _pools[key]
+
+@contextmanager
+def pooled_connection(dbname=None):
+    """
+    Borrow a connection from the process pool.
+
+    The connection is health-checked before use (broken ones are discarded
+    and replaced) and any open transaction is rolled back when it is returned.
+    """
+    conn_pool = get_pool(dbname)
+    conn = conn_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+    except psycopg2.Error:
+        conn_pool.putconn(conn, close=True)
+        conn = conn_pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.rollback()
+        conn_pool.putconn(conn, close=bool(conn.closed))
+
+# Changes whenever a table is recreated (new oid) or written to.
+# A partitioned parent has no rows (and no write counters) of its own, so
+# its signature lists every leaf partition instead; attaching or detaching
+# a partition changes the signature too.
+SIGNATURE_SQL = """
+    SELECT string_agg(c.oid::text || ':' || COALESCE(s.n_tup_ins + s.n_tup_upd + s.n_tup_del, 0),
+                      ',' ORDER BY c.oid)
+    FROM pg_class c
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE (c.oid = to_regclass(%(table)s) AND c.relkind <> 'p')
+       OR c.oid IN (SELECT relid FROM pg_partition_tree(to_regclass(%(table)s)) WHERE isleaf)
+"""
+
+def table_signature(cur, table):
+    """
+    oid:writes signature of `table` (shared by the incremental jobs), one
+    entry per leaf partition when it is partitioned, or None if missing.
+
+    The write counts come from pg_stat_user_tables, which is not
+    transactional and is reset by a crash restart or pg_stat_reset(): after
+    a reset every signature changes, so callers redo their work once.
+    """
+    cur.execute(SIGNATURE_SQL, {'table': table})
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def table_partitions(cur, table):
+    """Partitions of `table` by name, or [table] itself when it is not partitioned."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+    """, (table,))
+    return [row[0] for row in cur.fetchall()] or [table]
+
+def get_engine(dbname=None):
+    """
+    Process-wide SQLAlchemy engine, created on first use. Its pool pings
+    connections before handing them out, so stale ones are replaced.
+    """
+    key = _cache_key(dbname)
+    with _lock:
+        if key not in _engines:
+            from sqlalchemy import create_engine
+            from sqlalchemy.engine import URL
+
+            params = db_params(dbname)
+            url = URL.create(
+                'postgresql+psycopg2',
+                username=params['user'],
+                password=params['password'],
+                host=params['host'],
+                port=params['port'],
+                database=params['dbname'],
+            )
+            _engines[key] = create_engine(
+                url, pool_size=POOL_MAX_CONN, pool_pre_ping=True, pool_recycle=1800
+            )
+        return _engines[key]
@@ -0,0 +1,196 @@
+"""
+Binary columnar cache of the monthly customer CSVs.
+
+Each data_YYYY_mon.csv is parsed once into fixed-width column files that
+are memory-mapped on later reads:
+
+    event_time  int64    nanoseconds since epoch (UTC)
+    event_type  uint8    codes into meta.json "event_types"
+    price       float32  NaN when missing
+    user_id     int32    -1 when missing
+
+A cache entry is reused while the CSV keeps the size and mtime recorded in
+meta.json; if only the mtime moved, the content hash decides. Counting event
+types is then a bincount over a mapped uint8 column instead of a CSV parse.
+"""
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+from manifest import file_hash
+
+CACHE_DIR = os.environ.get(
+    'EVENT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'events'))
+CHUNK_ROWS = 1000000
+FORMAT_VERSION = 1
+
+COLUMNS = {
+    'event_time': np.int64,
+    'event_type': np.uint8,
+    'price': np.float32,
+    'user_id': np.int32,
+}
+
+
+def _entry_dir(csv_path, cache_dir):
+    path = os.path.abspath(csv_path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{name}-{digest}")
+
+
+def _read_meta(entry):
+    try:
+        with open(os.path.join(entry, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(entry, meta):
+    tmp = os.path.join(entry, 'meta.json.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(entry, 'meta.json'))
+
+
+def _is_valid(csv_path, entry, meta):
+    """True if `meta` still describes `csv_path` (hashing only when the mtime moved)."""
+    if not meta or meta.get('version') != FORMAT_VERSION:
+        return False
+    st = os.stat(csv_path)
+    if st.st_size != meta['size']:
+        return False
+    if st.st_mtime == meta['mtime']:
+        return True
+    if file_hash(csv_path) != meta['hash']:
+        return False
+    meta['mtime'] = st.st_mtime
+    _write_meta(entry, meta)
+    return True
+
+
+def parse_event_times(s):
+    """Parse event_time strings ("2022-10-01 00:00:00 UTC") as UTC datetimes."""
+    # Parsing %Z is ~30x slower than a fixed format, so the zone suffix is
+    # stripped first.
+    try:
+        if s.str.endswith(' UTC').all():
+            return pd.to_datetime(s.str.slice(0, -4), format='%Y-%m-%d %H:%M:%S', utc=True)
+    except (ValueError, TypeError):
+        pass
+    return pd.to_datetime(s, format='mixed', utc=True)
+
+
+def build(csv_path, cache_dir=CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    """Parse `csv_path` into a fresh cache entry and return its metadata."""
+    entry = _entry_dir(csv_path, cache_dir)
+    tmp = entry + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    st = os.stat(csv_path)
+    event_types = []
+    codes = {}
+    rows = 0
+    files = {col: open(os.path.join(tmp, f"{col}.bin"), 'wb') for col in COLUMNS}
+    try:
+        reader = pd.read_csv(
+            csv_path, usecols=list(COLUMNS), chunksize=chunk_rows,
+            dtype={'event_type': str, 'price': np.float64, 'user_id': np.float64},
+        )
+        for chunk in reader:
+            for value in chunk['event_type'].dropna().unique():
+                if value not in codes:
+                    codes[value] = len(event_types)
+                    event_types.append(value)
+            if len(event_types) > 255:
+                raise ValueError(f"{csv_path}: more than 255 event types, uint8 codes overflow")
+
+            user_id = chunk['user_id'].fillna(-1)
+            if user_id.max() > np.iinfo(np.int32).max:
+                raise ValueError(f"{csv_path}: user_id does not fit in int32")
+
+            times = parse_event_times(chunk['event_time']).values.astype('datetime64[ns]')
+            # 255 marks a missing event_type.
+            columns = {
+                'event_time': times.view(np.int64),
+                'event_type': chunk['event_type'].map(codes).fillna(255).to_numpy(np.uint8),
+                'price': chunk['price'].to_numpy(np.float32),
+                'user_id': user_id.to_numpy(np.int32),
+            }
+            for col, values in columns.items():
+                files[col].write(np.ascontiguousarray(values, dtype=COLUMNS[col]).tobytes())
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'source': os.path.abspath(csv_path),
+        'size': st.st_size,
+        'mtime': st.st_mtime,
+        'hash': file_hash(csv_path),
+        'rows': rows,
+        'event_types': event_types,
+    }
+    _write_meta(tmp, meta)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.rename(tmp, entry)
+    return meta
+
+
+def open_columns(csv_path, columns=None, cache_dir=CACHE_DIR):
+    """
+    Memory-mapped columns of `csv_path`, building the cache entry if it is
+    missing or stale. Returns (arrays by column name, meta).
+    """
+    entry = _entry_dir(csv_path, cache_dir)
+    meta = _read_meta(entry)
+    if not _is_valid(csv_path, entry, meta):
+        meta = build(csv_path, cache_dir)
+    arrays = {}
+    for col in columns or COLUMNS:
+        if meta['rows'] == 0:
+            arrays[col] = np.empty(0, dtype=COLUMNS[col])
+        else:
+            arrays[col] = np.memmap(os.path.join(entry, f"{col}.bin"),
+                                    dtype=COLUMNS[col], mode='r', shape=(meta['rows'],))
+    return arrays, meta
+
+
+def event_type_counts(csv_paths, cache_dir=CACHE_DIR):
+    """Number of events per event_type across all files, most frequent first."""
+    totals = {}
+    for path in csv_paths:
+        arrays, meta = open_columns(path, ['event_type'], cache_dir)
+        counts = np.bincount(arrays['event_type'], minlength=len(meta['event_types']))
+        for code, name in enumerate(meta['event_types']):
+            totals[name] = totals.get(name, 0) + int(counts[code])
+    return pd.Series(totals, dtype=np.int64, name='count').sort_values(ascending=False)
+
+
+def load_frame(csv_path, columns=None, cache_dir=CACHE_DIR):
+    """
+    DataFrame view of one cached file: event_time as datetime64[ns, UTC],
+    event_type as a categorical built from the stored codes and user_id as
+    nullable Int64 (<NA> where the CSV cell was blank), as read_csv gives it.
+    """
+    arrays, meta = open_columns(csv_path, columns, cache_dir)
+    data = {}
+    for col, values in arrays.items():
+        if col == 'event_time':
+            data[col] = pd.to_datetime(values.view('datetime64[ns]'), utc=True)
+        elif col == 'event_type':
+            codes = np.where(values == 255, -1, values).astype(np.int16)
+            data[col] = pd.Categorical.from_codes(codes, meta['event_types'])
+        elif col == 'user_id':
+            data[col] = pd.arrays.IntegerArray(values.astype(np.int64), values == -1)
+        else:
+            data[col] = values
+    return pd.DataFrame(data, copy=False)
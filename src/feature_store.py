@@ -0,0 +1,92 @@
+"""
+Per-user purchase features shared by the 02_data_analyst scripts.
+
+building.py, elbow.py and clustering.py all need, per user and date range,
+the purchase count, total spending and recency. The features are built once
+per range into `user_features` with a single scan of customers_full and
+reused until the source table changes.
+"""
+import pandas as pd
+from db_utils import pooled_connection, table_signature
+import queries
+
+SOURCE_TABLE = 'customers_full'
+# Bumped when the feature definitions change, so older builds are redone.
+FEATURES_VERSION = 2
+
+DDL = """
+CREATE TABLE IF NOT EXISTS user_features (
+    range_start     DATE NOT NULL,
+    range_end       DATE NOT NULL,
+    user_id         BIGINT NOT NULL,
+    purchase_count  INTEGER NOT NULL,
+    total_spending  NUMERIC NOT NULL,
+    recency_days    INTEGER NOT NULL,
+    PRIMARY KEY (range_start, range_end, user_id)
+);
+CREATE TABLE IF NOT EXISTS user_features_builds (
+    range_start      DATE NOT NULL,
+    range_end        DATE NOT NULL,
+    source_signature TEXT NOT NULL,
+    built_at         TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (range_start, range_end)
+);
+"""
+
+
+def source_signature(cur):
+    return f'v{FEATURES_VERSION}:{table_signature(cur, SOURCE_TABLE)}'
+
+
+def _range_key(start, end):
+    return pd.Timestamp(start).date(), pd.Timestamp(end).date()
+
+
+def ensure_features(start, end):
+    """
+    Build the features for [start, end] (inclusive days) unless an up-to-date
+    build exists. Returns True when a build was needed.
+    """
+    range_start, range_end = _range_key(start, end)
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        # Serialize concurrent builders (e.g. several charts rendered at once);
+        # taken before the DDL so two first runs cannot race on CREATE TABLE.
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('user_features'))")
+        cur.execute(DDL)
+
+        signature = source_signature(cur)
+        cur.execute("""
+            SELECT source_signature FROM user_features_builds
+            WHERE range_start = %s AND range_end = %s
+        """, (range_start, range_end))
+        row = cur.fetchone()
+        if row is not None and row[0] == signature:
+            conn.commit()
+            return False
+
+        cur.execute("""
+            DELETE FROM user_features WHERE range_start = %s AND range_end = %s
+        """, (range_start, range_end))
+        queries.execute(cur, 'build_user_features',
+                        range_start, range_end, *queries.day_range(start, end))
+        cur.execute("""
+            INSERT INTO user_features_builds (range_start, range_end, source_signature)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (range_start, range_end) DO UPDATE
+            SET source_signature = EXCLUDED.source_signature, built_at = now()
+        """, (range_start, range_end, signature))
+        conn.commit()
+        cur.close()
+    print(f"Built user features for {start} .. {end} from {SOURCE_TABLE}.")
+    return True
+
+
+def load_user_features(start, end, max_spending=None):
+    """
+    DataFrame with user_id, purchase_count, total_spending and recency_days
+    for users with at least one purchase in [start, end], building the
+    features first if needed. `max_spending` keeps only total_spending below it.
+    """
+    ensure_features(start, end)
+    return queries.fetch_df('user_features', *_range_key(start, end), max_spending)
@@ -0,0 +1,137 @@
+"""
+HyperLogLog distinct counter for integer ids (NumPy, vectorised).
+
+A sketch uses 2**precision one-byte registers whatever the number of ids
+added, has a relative standard error of about 1.04 / sqrt(2**precision),
+and two sketches of the same precision merge losslessly (register-wise
+max), so per-day sketches can be combined into monthly counts.
+"""
+import math
+import numpy as np
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+DEFAULT_ERROR = 0.01
+
+
+def precision_for_error(error):
+    """Smallest precision whose standard error is at most `error`."""
+    p = math.ceil(math.log2((1.04 / error) ** 2))
+    return min(max(p, MIN_PRECISION), MAX_PRECISION)
+
+
+def _hash64(values):
+    """splitmix64 finaliser: well-mixed 64-bit hashes of integer ids."""
+    with np.errstate(over='ignore'):
+        h = np.asarray(values).astype(np.uint64)
+        h = h + np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return h ^ (h >> np.uint64(31))
+
+
+def _bit_length(x):
+    """Exact bit length of uint64 values (frexp on 32-bit halves is exact)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+def _sigma(x):
+    """sigma(x) = x + sum_k x**(2**k) * 2**(k-1), summed until it converges."""
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        z_prev = z
+        z += x * y
+        y += y
+        if z == z_prev:
+            return z
+
+
+def _tau(x):
+    """tau(x) = (1 - x - sum_k (1 - x**(2**-k))**2 * 2**-k) / 3."""
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        z_prev = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == z_prev:
+            return z / 3
+
+
+class HyperLogLog:
+    def __init__(self, precision=None, registers=None):
+        self.precision = precision or precision_for_error(DEFAULT_ERROR)
+        if not MIN_PRECISION <= self.precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be in [{MIN_PRECISION}, {MAX_PRECISION}]")
+        m = 1 << self.precision
+        if registers is None:
+            registers = np.zeros(m, dtype=np.uint8)
+        elif len(registers) != m:
+            raise ValueError(f"expected {m} registers, got {len(registers)}")
+        self.registers = registers
+
+    @classmethod
+    def for_error(cls, error):
+        return cls(precision_for_error(error))
+
+    @classmethod
+    def from_bytes(cls, precision, data):
+        return cls(precision, np.frombuffer(data, dtype=np.uint8).copy())
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @property
+    def error(self):
+        """Relative standard error of count()."""
+        return 1.04 / math.sqrt(1 << self.precision)
+
+    def add(self, values):
+        """Add an array of integer ids."""
+        if len(values) == 0:
+            return self
+        h = _hash64(values)
+        p = self.precision
+        index = (h >> np.uint64(64 - p)).astype(np.intp)
+        rest = h & np.uint64((1 << (64 - p)) - 1)
+        rank = (64 - p + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        """Fold `other` into this sketch (same precision required)."""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    def count(self):
+        """
+        Estimated number of distinct ids added, with Ertl's improved
+        estimator ("New cardinality estimation algorithms for HyperLogLog
+        sketches", 2017). Unlike the raw estimate with a linear-counting
+        switch, it has no bias bump around 2.5 * 2**precision ids.
+        """
+        m = 1 << self.precision
+        q = 64 - self.precision
+        histogram = np.bincount(self.registers, minlength=q + 2)
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        if math.isinf(z):
+            return 0
+        return int(round(m * m / (2 * math.log(2) * z)))
+
+    def __repr__(self):
+        return f"HyperLogLog(precision={self.precision}, ~{self.count()} distinct)"
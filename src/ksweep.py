@@ -0,0 +1,146 @@
+"""
+k-sweep engine for the elbow method.
+
+The features are scaled once into a contiguous float32 matrix that is
+placed in shared memory, so worker processes read it without copies or
+pickling. Two strategies:
+
+- 'parallel': every k is an independent fit, run concurrently across cores
+  (each worker limited to its share of the BLAS/OpenMP threads).
+- 'warm': k runs in sequence and each fit is seeded from the k-1 solution,
+  with its highest-SSE cluster split in two along its principal axis, so
+  it converges in a few iterations instead of a full k-means++
+  initialisation.
+
+Either strategy can use MiniBatchKMeans for very large user bases. Every k
+reports its WCSS, the silhouette on a random sample and the wall time.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+RANDOM_STATE = 42
+SILHOUETTE_SAMPLE = 10000
+MINIBATCH_SIZE = 4096
+
+# Worker-side view of the shared feature matrix.
+_shared = {}
+
+
+def scaled_matrix(features):
+    """Standard-scaled features as a C-contiguous float32 array."""
+    return np.ascontiguousarray(StandardScaler().fit_transform(features), dtype=np.float32)
+
+
+def _model(k, minibatch, init='k-means++'):
+    n_init = 1 if not isinstance(init, str) else 'auto'
+    if minibatch:
+        return MiniBatchKMeans(n_clusters=k, init=init, n_init=n_init, batch_size=MINIBATCH_SIZE,
+                               random_state=RANDOM_STATE)
+    return KMeans(n_clusters=k, init=init, n_init=n_init, max_iter=300, random_state=RANDOM_STATE)
+
+
+def _silhouette(X, labels, sample_size):
+    if len(np.unique(labels)) < 2:
+        return float('nan')
+    return float(silhouette_score(X, labels, sample_size=min(sample_size, len(X)),
+                                  random_state=RANDOM_STATE))
+
+
+def _fit(X, k, minibatch, sample_size, init='k-means++'):
+    t0 = time.perf_counter()
+    model = _model(k, minibatch, init).fit(X)
+    seconds = time.perf_counter() - t0
+    return {
+        'k': k,
+        'wcss': float(model.inertia_),
+        'silhouette': _silhouette(X, model.labels_, sample_size),
+        'seconds': seconds,
+        'centers': model.cluster_centers_,
+        'labels': model.labels_,
+    }
+
+
+def _attach(name, shape, dtype, threads):
+    shm = shared_memory.SharedMemory(name=name)
+    _shared['shm'] = shm
+    _shared['X'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    threadpool_limits(threads)
+
+
+def _fit_shared(k, minibatch, sample_size):
+    result = _fit(_shared['X'], k, minibatch, sample_size)
+    del result['labels']  # not needed by the parent; avoids pickling n labels
+    return result
+
+
+def _next_init(X, centers, labels):
+    """
+    Previous centroids with the cluster of largest SSE split in two along its
+    principal axis (one standard deviation either side of its centroid).
+    """
+    sse = np.bincount(labels, weights=((X - centers[labels]) ** 2).sum(axis=1),
+                      minlength=len(centers))
+    j = int(np.argmax(sse))
+    members = X[labels == j]
+    if len(members) < 2:
+        return np.vstack([centers, X[np.argmax(((X - centers[j]) ** 2).sum(axis=1))]])
+    eigvals, eigvecs = np.linalg.eigh(np.cov(members, rowvar=False).reshape(X.shape[1], -1))
+    step = np.sqrt(max(eigvals[-1], 0.0)) * eigvecs[:, -1]
+    init = centers.copy()
+    init[j] = centers[j] - step
+    return np.vstack([init, centers[j] + step]).astype(X.dtype)
+
+
+def sweep_parallel(X, k_values, minibatch=False, workers=None, sample_size=SILHOUETTE_SAMPLE):
+    """Independent fits for every k, run across processes over shared memory."""
+    workers = min(workers or os.cpu_count() or 1, len(k_values))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    shm = shared_memory.SharedMemory(create=True, size=X.nbytes)
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shm.name, X.shape, X.dtype, threads)) as pool:
+            futures = [pool.submit(_fit_shared, k, minibatch, sample_size) for k in k_values]
+            results = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def sweep_warm(X, k_values, minibatch=False, sample_size=SILHOUETTE_SAMPLE):
+    """Fits k = min..max in order, each seeded from the previous solution."""
+    results = []
+    previous = None
+    for k in sorted(k_values):
+        if previous is None or len(previous['centers']) != k - 1:
+            init = 'k-means++'
+        else:
+            init = _next_init(X, previous['centers'], previous['labels'])
+        previous = _fit(X, k, minibatch, sample_size, init)
+        results.append(previous)
+    for result in results:
+        del result['labels']
+    return results
+
+
+def sweep(features, k_values, strategy='parallel', minibatch=False, workers=None,
+          sample_size=SILHOUETTE_SAMPLE):
+    """
+    Run the k-sweep over `features` (DataFrame or array, unscaled).
+    Returns one dict per k with 'k', 'wcss', 'silhouette', 'seconds' and 'centers'.
+    """
+    X = scaled_matrix(features)
+    if strategy == 'warm':
+        return sweep_warm(X, k_values, minibatch, sample_size)
+    if strategy == 'parallel':
+        return sweep_parallel(X, k_values, minibatch, workers, sample_size)
+    raise ValueError(f"unknown strategy: {strategy}")
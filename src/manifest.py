@@ -0,0 +1,89 @@
+import os
+import hashlib
+
+MANIFEST_TABLE = 'load_manifest'
+HASH_CHUNK = 1 << 20
+
+def ensure_manifest(conn):
+    """Create the ingestion manifest table if it does not exist yet."""
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            source_path  TEXT PRIMARY KEY,
+            table_name   TEXT NOT NULL,
+            size_bytes   BIGINT NOT NULL,
+            mtime        DOUBLE PRECISION NOT NULL,
+            content_hash TEXT NOT NULL,
+            loaded_at    TIMESTAMP NOT NULL DEFAULT now()
+        );
+    """)
+    conn.commit()
+    cur.close()
+
+def file_hash(path):
+    """SHA-256 of the file, read in fixed-size chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def check_source(cur, csv_path, table_name):
+    """
+    Compare a source file with its manifest entry.
+
+    Returns (changed, fingerprint) where fingerprint is a dict with path,
+    size, mtime and hash. The hash is only computed when size or mtime differ
+    from the recorded ones (or the file is new), so unchanged files cost a
+    single stat. A file whose target table has been dropped counts as changed.
+    When only size/mtime moved and the hash still matches, the manifest entry
+    is updated to the new size/mtime (the caller commits), so the next check
+    is a single stat again.
+    """
+    path = os.path.abspath(csv_path)
+    st = os.stat(path)
+    fingerprint = {'path': path, 'size': st.st_size, 'mtime': st.st_mtime, 'hash': None}
+
+    cur.execute(
+        f"SELECT table_name, size_bytes, mtime, content_hash FROM {MANIFEST_TABLE} "
+        "WHERE source_path = %s",
+        (path,)
+    )
+    row = cur.fetchone()
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{table_name}"',))
+    table_exists = cur.fetchone()[0]
+    if row is None or row[0] != table_name or not table_exists:
+        fingerprint['hash'] = file_hash(path)
+        return True, fingerprint
+
+    _, size, mtime, content_hash = row
+    if size == st.st_size and mtime == st.st_mtime:
+        fingerprint['hash'] = content_hash
+        return False, fingerprint
+
+    fingerprint['hash'] = file_hash(path)
+    if fingerprint['hash'] != content_hash:
+        return True, fingerprint
+    cur.execute(
+        f"UPDATE {MANIFEST_TABLE} SET size_bytes = %s, mtime = %s WHERE source_path = %s",
+        (st.st_size, st.st_mtime, path)
+    )
+    return False, fingerprint
+
+def record_load(cur, fingerprint, table_name):
+    """Upsert the manifest entry; runs inside the caller's transaction."""
+    cur.execute(
+        f"""
+        INSERT INTO {MANIFEST_TABLE}
+            (source_path, table_name, size_bytes, mtime, content_hash, loaded_at)
+        VALUES (%s, %s, %s, %s, %s, now())
+        ON CONFLICT (source_path) DO UPDATE SET
+            table_name = EXCLUDED.table_name,
+            size_bytes = EXCLUDED.size_bytes,
+            mtime = EXCLUDED.mtime,
+            content_hash = EXCLUDED.content_hash,
+            loaded_at = EXCLUDED.loaded_at
+        """,
+        (fingerprint['path'], table_name, fingerprint['size'],
+         fingerprint['mtime'], fingerprint['hash'])
+    )
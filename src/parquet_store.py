@@ -0,0 +1,177 @@
+"""
+Local columnar copy of customers_full, stored as partitioned Parquet.
+
+export_customers_full() streams the table out of PostgreSQL once and writes
+it under a hive-style layout (month=YYYY-MM/event_type=.../*.parquet) with
+dictionary-encoded strings. read_customers() then serves the analyst
+scripts in-process and offline: only the requested columns are read, and
+filters prune whole partitions and Parquet row groups before any data is
+decoded.
+
+pyarrow is optional; it is imported when one of these functions is used.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+from datetime import timedelta
+
+import pandas as pd
+from db_utils import pooled_connection
+
+SOURCE_TABLE = 'customers_full'
+PARQUET_DIR = os.environ.get(
+    'CUSTOMERS_PARQUET',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'customers_full'))
+BATCH_SIZE = 500000
+ROW_GROUP_SIZE = 250000
+
+EXPORT_SQL = f"""
+    SELECT
+        event_time,
+        product_id::bigint,
+        purchase_price::float8,
+        user_id::bigint,
+        user_session::text,
+        category_id::bigint,
+        category_code::text,
+        item_brand::text,
+        item_price::float8,
+        to_char(event_time, 'YYYY-MM') AS month,
+        event_type::text
+    FROM {SOURCE_TABLE}
+    WHERE event_time IS NOT NULL
+"""
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is required for the Parquet store: pip install pyarrow") from e
+    return pa, ds, pq
+
+
+def _schemas(pa):
+    """(file schema, partitioning schema); partition columns are not stored in the files."""
+    strings = pa.dictionary(pa.int32(), pa.string())
+    partitions = pa.schema([('month', pa.string()), ('event_type', pa.string())])
+    columns = pa.schema([
+        ('event_time', pa.timestamp('us')),
+        ('product_id', pa.int64()),
+        ('purchase_price', pa.float64()),
+        ('user_id', pa.int64()),
+        ('user_session', pa.string()),
+        ('category_id', pa.int64()),
+        ('category_code', strings),
+        ('item_brand', strings),
+        ('item_price', pa.float64()),
+    ])
+    return pa.schema(list(columns) + list(partitions)), partitions
+
+
+def _batches(cur, schema, pa, batch_size):
+    names = schema.names
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        df = pd.DataFrame.from_records(rows, columns=names)
+        yield pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def export_customers_full(path=PARQUET_DIR, batch_size=BATCH_SIZE):
+    """
+    Write customers_full to `path` as Parquet partitioned by month and
+    event_type. The export goes to a temporary directory that replaces `path`
+    only once complete. Returns the number of rows written.
+    """
+    pa, ds, _ = _arrow()
+    schema, partitions = _schemas(pa)
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    written = 0
+    with pooled_connection() as conn:
+        with conn.cursor(name='parquet_export') as cur:
+            cur.itersize = batch_size
+            cur.execute(EXPORT_SQL)
+
+            def counted():
+                nonlocal written
+                for batch in _batches(cur, schema, pa, batch_size):
+                    written += batch.num_rows
+                    yield batch
+
+            ds.write_dataset(
+                counted(), tmp_path,
+                schema=schema,
+                format='parquet',
+                partitioning=ds.partitioning(partitions, flavor='hive'),
+                file_options=ds.ParquetFileFormat().make_write_options(
+                    use_dictionary=True, compression='snappy'),
+                max_rows_per_group=ROW_GROUP_SIZE,
+                min_rows_per_group=ROW_GROUP_SIZE // 4,
+                existing_data_behavior='overwrite_or_ignore',
+            )
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+    return written
+
+
+def read_customers(columns=None, filters=None, start=None, end=None, path=PARQUET_DIR):
+    """
+    Read the exported customers_full as a pandas DataFrame.
+
+    - columns: list of columns to load (None = all).
+    - filters: pyarrow filters, e.g. [('event_type', '=', 'purchase')].
+    - start/end: optional half-open event_time window [start, end), e.g. from
+      queries.day_range(); also used to skip whole month partitions.
+    Dictionary-encoded strings come back as pandas categoricals.
+    """
+    pa, ds, pq = _arrow()
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No Parquet export at {path}; run parquet_store.py first")
+
+    filters = list(filters or [])
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters += [('month', '>=', f"{start:%Y-%m}"), ('event_time', '>=', start.to_pydatetime())]
+    if end is not None:
+        end = pd.Timestamp(end)
+        last = end - timedelta(microseconds=1)
+        filters += [('month', '<=', f"{last:%Y-%m}"), ('event_time', '<', end.to_pydatetime())]
+
+    _, partitions = _schemas(pa)
+    table = pq.read_table(
+        path,
+        columns=columns,
+        filters=filters or None,
+        partitioning=ds.partitioning(partitions, flavor='hive'),
+    )
+    return table.to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export customers_full to partitioned Parquet')
+    parser.add_argument('--path', default=PARQUET_DIR, help='Output directory')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='Rows fetched from PostgreSQL per batch')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    try:
+        rows = export_customers_full(os.path.abspath(args.path), args.batch_size)
+    except ImportError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Exported {rows} rows of {SOURCE_TABLE} to {os.path.abspath(args.path)} "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Scatter plots that stay fast for any number of points.
+
+Up to MAX_POINTS points are drawn as ordinary markers. Above that,
+scatter() switches to a rendering whose cost does not grow with the
+marker count:
+
+- 'sample'  : stratified downsampling. Every class keeps a share of the
+              MAX_POINTS markers in proportion to its size, and small
+              classes keep a minimum share so they do not vanish.
+- 'density' : a 2-D histogram per class (hexbin when there are no
+              classes), coloured by class, with opacity growing with the
+              log of the count.
+
+In 'auto' mode, labelled clouds are sampled and unlabelled ones are drawn
+as densities. MAX_POINTS can be set with the SCATTER_MAX_POINTS
+environment variable.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from matplotlib.colors import LinearSegmentedColormap, to_rgba
+
+MAX_POINTS = int(os.environ.get('SCATTER_MAX_POINTS', 50000))
+DENSITY_BINS = 200
+RANDOM_STATE = 42
+MODES = ('auto', 'points', 'sample', 'density')
+
+
+def _factorize(labels):
+    codes, classes = pd.factorize(pd.Series(labels), use_na_sentinel=False)
+    return codes, list(classes)
+
+
+def _sample_codes(codes, n_classes, max_points, random_state):
+    n = len(codes)
+    if n <= max_points:
+        return np.arange(n)
+    counts = np.bincount(codes, minlength=n_classes)
+    floor = max_points // (2 * n_classes)
+    guaranteed = np.minimum(counts, floor)
+    quota = np.minimum(np.maximum(counts * max_points // n, guaranteed), counts)
+    # Raising small classes to their floor may overshoot max_points: take
+    # the excess from the classes above their floor, in proportion.
+    excess = int(quota.sum()) - max_points
+    if excess > 0:
+        reducible = quota - guaranteed
+        quota -= np.ceil(reducible * excess / reducible.sum()).astype(quota.dtype)
+    rng = np.random.default_rng(random_state)
+    picks = [rng.choice(np.flatnonzero(codes == k), size=q, replace=False)
+             for k, q in enumerate(quota) if q]
+    return np.sort(np.concatenate(picks))
+
+
+def stratified_sample(labels, max_points=MAX_POINTS, random_state=RANDOM_STATE):
+    """
+    Sorted indices of at most max_points rows, drawn per class in proportion
+    to class size. Every class keeps at least min(size, max_points / (2 *
+    n_classes)) rows; the larger classes give up the difference.
+    """
+    codes, classes = _factorize(labels)
+    return _sample_codes(codes, len(classes), max_points, random_state)
+
+
+def _classes(classes, colors):
+    """(class, color, code) for every class to draw, in `colors` order when given."""
+    present = {c: k for k, c in enumerate(classes) if not pd.isna(c)}
+    if colors is None:
+        return [(c, f'C{i}', k) for i, (c, k) in enumerate(present.items())]
+    return [(c, color, present[c]) for c, color in colors.items() if c in present]
+
+
+def _extent(x, y):
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        return [[0.0, 1.0], [0.0, 1.0]]
+    x, y = x[finite], y[finite]
+    pad_x = (x.max() - x.min()) * 0.01 or 0.5
+    pad_y = (y.max() - y.min()) * 0.01 or 0.5
+    return [[x.min() - pad_x, x.max() + pad_x], [y.min() - pad_y, y.max() + pad_y]]
+
+
+def _legend_proxy(ax, color, label):
+    """Empty marker series, so density layers still get a legend entry."""
+    ax.scatter([], [], color=color, marker='s', label=label)
+
+
+def _draw_density(ax, x, y, codes, groups, bins, label, color):
+    extent = _extent(x, y)
+    if groups is None:
+        cmap = LinearSegmentedColormap.from_list(
+            'density', [to_rgba(color or 'C0', 0.25), to_rgba(color or 'C0', 1.0)])
+        ax.hexbin(x, y, gridsize=bins // 2, bins='log', mincnt=1, cmap=cmap,
+                  extent=extent[0] + extent[1], linewidths=0)
+        if label:
+            _legend_proxy(ax, color or 'C0', label)
+        return
+    for cls, cls_color, code in groups:
+        finite = (codes == code) & np.isfinite(x) & np.isfinite(y)
+        counts, _, _ = np.histogram2d(x[finite], y[finite], bins=bins, range=extent)
+        if not counts.any():
+            continue
+        image = np.zeros(counts.shape + (4,))
+        image[..., :3] = to_rgba(cls_color)[:3]
+        image[..., 3] = np.log1p(counts) / np.log1p(counts.max())
+        ax.imshow(image.transpose(1, 0, 2), origin='lower', aspect='auto', interpolation='nearest',
+                  extent=extent[0] + extent[1])
+        _legend_proxy(ax, cls_color, str(cls))
+    ax.set_xlim(extent[0])
+    ax.set_ylim(extent[1])
+
+
+def scatter(ax, x, y, labels=None, colors=None, label=None, color=None, mode='auto',
+            max_points=MAX_POINTS, bins=DENSITY_BINS, **kwargs):
+    """
+    Draw the point cloud (x, y) on `ax`.
+
+    labels : optional class of every point, drawn one color per class.
+    colors : {class: color}. When given, only these classes are drawn, in this
+             order. Otherwise every class is drawn with the default color cycle.
+    label, color : legend label and color of an unlabelled cloud.
+    mode   : 'auto', 'points', 'sample' or 'density' (see the module docstring).
+
+    Extra keyword arguments go to ax.scatter. Returns the mode actually used.
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown scatter mode: {mode}")
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if mode == 'auto':
+        if len(x) <= max_points:
+            mode = 'points'
+        else:
+            mode = 'sample' if labels is not None else 'density'
+
+    codes, groups = None, None
+    if labels is not None:
+        codes, classes = _factorize(labels)
+        groups = _classes(classes, colors)
+    if mode == 'density':
+        _draw_density(ax, x, y, codes, groups, bins, label, color)
+        return mode
+
+    if mode == 'sample':
+        if codes is None:
+            keep = _sample_codes(np.zeros(len(x), dtype=np.intp), 1, max_points, RANDOM_STATE)
+        else:
+            keep = _sample_codes(codes, len(classes), max_points, RANDOM_STATE)
+            codes = codes[keep]
+        x, y = x[keep], y[keep]
+    if groups is None:
+        ax.scatter(x, y, color=color, label=label, **kwargs)
+    else:
+        for cls, cls_color, code in groups:
+            mask = codes == code
+            ax.scatter(x[mask], y[mask], color=cls_color, label=str(cls), **kwargs)
+    return mode
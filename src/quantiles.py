@@ -0,0 +1,166 @@
+"""
+Mergeable quantile sketch for box-plot statistics.
+
+Prices are amounts in cents, so instead of an approximate t-digest the
+sketch keeps exact counts per distinct value (optionally rounded to a
+resolution). With a resolution the values are stored as integer multiples of
+it and only turned back into floats when a statistic is read, so rounding
+never drifts (30.4 stays 30.4, not 30.400000000000002). Memory is bounded by
+the number of distinct values, not by the number of rows; sketches built
+per batch or per monthly partition merge by adding counts, and quantiles
+are exact (linear interpolation, as numpy.percentile / percentile_cont).
+Mean and variance are merged with Chan's parallel formulas.
+"""
+import math
+import numpy as np
+
+
+class QuantileSketch:
+    def __init__(self, resolution=0.01):
+        self.resolution = resolution
+        # Distinct values: int64 multiples of the resolution, or the raw
+        # floats when there is none.
+        self.keys = np.empty(0, dtype=np.int64 if resolution else np.float64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _to_keys(self, values):
+        if not self.resolution:
+            return values
+        return np.rint(values / self.resolution).astype(np.int64)
+
+    def _to_values(self, keys):
+        if not self.resolution:
+            return keys
+        # Dividing by an exact integer scale (100 for cents) gives the float
+        # nearest to the decimal value; multiplying by 0.01 does not.
+        scale = 1 / self.resolution
+        if abs(scale - round(scale)) < 1e-9:
+            return keys / round(scale)
+        return keys * float(self.resolution)
+
+    @property
+    def values(self):
+        """Distinct values, ascending, as floats."""
+        return self._to_values(self.keys)
+
+    def _merge_counts(self, keys, counts):
+        merged, idx = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        self.counts = np.bincount(idx, weights=np.concatenate([self.counts, counts])).astype(np.int64)
+        self.keys = merged
+
+    def _merge_moments(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+
+    def add(self, values):
+        """Add a batch of values (NaN is ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        mean = float(values.mean())
+        self._merge_moments(values.size, mean, float(((values - mean) ** 2).sum()))
+        keys, counts = np.unique(self._to_keys(values), return_counts=True)
+        self._merge_counts(keys, counts)
+        return self
+
+    def add_counts(self, values, counts):
+        """Add pre-aggregated (value, count) pairs, e.g. a SQL GROUP BY."""
+        values = np.asarray(values, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.int64)
+        keep = ~np.isnan(values) & (counts > 0)
+        values, counts = values[keep], counts[keep]
+        if values.size == 0:
+            return self
+        n = int(counts.sum())
+        mean = float((values * counts).sum() / n)
+        self._merge_moments(n, mean, float((counts * (values - mean) ** 2).sum()))
+        self._merge_counts(self._to_keys(values), counts)
+        return self
+
+    def merge(self, other):
+        """Fold `other` (e.g. another month) into this sketch."""
+        if other.resolution != self.resolution:
+            raise ValueError("cannot merge sketches with different resolutions")
+        self._merge_moments(other.n, other.mean, other.m2)
+        self._merge_counts(other.keys, other.counts)
+        return self
+
+    def _at_rank(self, rank):
+        """Value of the rank-th smallest element (0-based)."""
+        key = self.keys[np.searchsorted(np.cumsum(self.counts), rank, side='right')]
+        return float(self._to_values(key))
+
+    def quantile(self, q):
+        """
+        q-th quantile, 0 <= q <= 1, interpolated linearly between ranks with
+        the same arithmetic as numpy.percentile, so the result is bit-for-bit
+        the one numpy gives on the raw values.
+        """
+        if self.n == 0:
+            return math.nan
+        h = (self.n - 1) * q
+        lo = math.floor(h)
+        t = h - lo
+        x_lo = self._at_rank(lo)
+        x_hi = self._at_rank(min(lo + 1, self.n - 1))
+        if t >= 0.5:
+            return x_hi - (x_hi - x_lo) * (1 - t)
+        return x_lo + (x_hi - x_lo) * t
+
+    def describe(self):
+        """Same keys as pandas.Series.describe()."""
+        return {
+            'count': float(self.n),
+            'mean': self.mean if self.n else math.nan,
+            'std': math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan,
+            'min': self._at_rank(0) if self.n else math.nan,
+            '25%': self.quantile(0.25),
+            '50%': self.quantile(0.5),
+            '75%': self.quantile(0.75),
+            'max': self._at_rank(self.n - 1) if self.n else math.nan,
+        }
+
+    def _fences(self, whis):
+        q1, q3 = self.quantile(0.25), self.quantile(0.75)
+        return q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+
+    def box_stats(self, whis=1.5):
+        """
+        Box-plot statistics: quartiles, IQR, whisker ends (most extreme values
+        within whis * IQR of the box) and the number of outliers on each side.
+        """
+        q1, med, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        low_fence, high_fence = self._fences(whis)
+        values = self.values
+        inside = (values >= low_fence) & (values <= high_fence)
+        return {
+            'n': self.n,
+            'mean': self.mean,
+            'q1': q1,
+            'med': med,
+            'q3': q3,
+            'iqr': q3 - q1,
+            'whislo': float(values[inside][0]) if inside.any() else q1,
+            'whishi': float(values[inside][-1]) if inside.any() else q3,
+            'n_low_outliers': int(self.counts[values < low_fence].sum()),
+            'n_high_outliers': int(self.counts[values > high_fence].sum()),
+        }
+
+    def outliers(self, whis=1.5):
+        """Distinct values beyond the whiskers and how often each occurs."""
+        low_fence, high_fence = self._fences(whis)
+        values = self.values
+        mask = (values < low_fence) | (values > high_fence)
+        return values[mask], self.counts[mask]
+
+    def __repr__(self):
+        return f"QuantileSketch(n={self.n}, distinct={self.keys.size})"
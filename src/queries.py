@@ -0,0 +1,144 @@
+"""
+Named, parameterized queries run as server-side prepared statements.
+
+Every query takes a half-open time window [start, end) as bind parameters
+instead of interpolating dates into the SQL text, so PostgreSQL can reuse
+the prepared plan across calls on the same (pooled) connection, e.g. when
+backfilling many date windows. Use day_range() to turn the inclusive
+--start/--end dates of the scripts into such a window.
+"""
+import re
+import weakref
+from datetime import timedelta
+import pandas as pd
+from db_utils import pooled_connection
+
+# name -> (parameter types, SQL using $1..$n)
+QUERIES = {
+    'purchase_prices': ('timestamp, timestamp', """
+        SELECT purchase_price::float8 AS price, user_id
+        FROM customers_full
+        WHERE event_type = 'purchase'
+          AND event_time >= $1
+          AND event_time < $2
+          AND purchase_price IS NOT NULL
+          AND user_id IS NOT NULL
+    """),
+    # One row per distinct price: enough for exact quantiles (QuantileSketch).
+    'purchase_price_counts': ('timestamp, timestamp', """
+        SELECT purchase_price::float8 AS price, COUNT(*) AS n
+        FROM customers_full
+        WHERE event_type = 'purchase'
+          AND event_time >= $1
+          AND event_time < $2
+          AND purchase_price IS NOT NULL
+          AND user_id IS NOT NULL
+        GROUP BY 1
+    """),
+    'user_avg_prices': ('timestamp, timestamp', """
+        SELECT user_id, AVG(purchase_price)::float8 AS avg_price
+        FROM customers_full
+        WHERE event_type = 'purchase'
+          AND event_time >= $1
+          AND event_time < $2
+          AND purchase_price IS NOT NULL
+          AND user_id IS NOT NULL
+        GROUP BY user_id
+    """),
+    # $1/$2: inclusive calendar range stored as the feature-store key (and
+    # recency is counted from $2, so a purchase on the last day is 0 days
+    # old), $3/$4: the matching half-open time window.
+    'build_user_features': ('date, date, timestamp, timestamp', """
+        INSERT INTO user_features
+            (range_start, range_end, user_id, purchase_count, total_spending, recency_days)
+        SELECT
+            $1, $2,
+            user_id::bigint,
+            COUNT(*),
+            SUM(purchase_price::numeric),
+            $2 - MAX(event_time)::date
+        FROM customers_full
+        WHERE event_type = 'purchase'
+          AND event_time >= $3
+          AND event_time < $4
+          AND purchase_price IS NOT NULL
+          AND user_id IS NOT NULL
+        GROUP BY user_id
+    """),
+    'user_features': ('date, date, numeric', """
+        SELECT user_id, purchase_count, total_spending, recency_days
+        FROM user_features
+        WHERE range_start = $1 AND range_end = $2
+          AND ($3 IS NULL OR total_spending < $3)
+    """),
+}
+
+# Statements already prepared on each live connection.
+_prepared = weakref.WeakKeyDictionary()
+
+# Rows per round trip when a query is streamed.
+STREAM_BATCH = 100000
+
+
+def day_range(start, end):
+    """Inclusive calendar dates -> half-open [start 00:00, end + 1 day 00:00)."""
+    start = pd.Timestamp(start).normalize().to_pydatetime()
+    end = pd.Timestamp(end).normalize().to_pydatetime() + timedelta(days=1)
+    return start, end
+
+
+def month_windows(start, end):
+    """Split the half-open window [start, end) into calendar-month windows."""
+    windows = []
+    lo = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    while lo < end:
+        hi = min(lo.normalize().replace(day=1) + pd.DateOffset(months=1), end)
+        windows.append((lo.to_pydatetime(), hi.to_pydatetime()))
+        lo = hi
+    return windows
+
+
+def execute(cur, name, *args):
+    """PREPARE `name` on the cursor's connection once, then EXECUTE it."""
+    prepared = _prepared.setdefault(cur.connection, set())
+    if name not in prepared:
+        arg_types, sql = QUERIES[name]
+        cur.execute(f'PREPARE {name} ({arg_types}) AS {sql}')
+        prepared.add(name)
+    placeholders = ', '.join(['%s'] * len(args))
+    cur.execute(f'EXECUTE {name} ({placeholders})', args)
+
+
+def fetch_df(name, *args):
+    """Run a named query on a pooled connection and return a DataFrame."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        execute(cur, name, *args)
+        columns = [desc[0] for desc in cur.description]
+        df = pd.DataFrame(cur.fetchall(), columns=columns)
+        cur.close()
+    return df
+
+
+def stream(name, *args, batch_size=STREAM_BATCH):
+    """
+    Yield the rows of a named query in lists of up to batch_size rows,
+    through a server-side cursor so the result is never held in full.
+    (A cursor cannot be declared over EXECUTE, so the SQL is sent as is,
+    with the $n placeholders bound as typed parameters.)
+    """
+    arg_types, sql = QUERIES[name]
+    types = [t.strip() for t in arg_types.split(',')]
+    sql = re.sub(r'\$(\d+)', lambda m: f"%(p{m.group(1)})s::{types[int(m.group(1)) - 1]}", sql)
+    params = {f'p{i}': arg for i, arg in enumerate(args, 1)}
+    with pooled_connection() as conn:
+        cur = conn.cursor(name=f'stream_{name}')
+        cur.itersize = batch_size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cur.close()
@@ -0,0 +1,240 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Rows per chunk in the inference pass.
+CHUNK_ROWS = 200000
+# String columns with at most this many distinct values become ENUM types...
+ENUM_MAX_VALUES = 16
+# ... but only when the column has enough rows for an enum to pay off.
+ENUM_MIN_ROWS = 1000
+# Leading values checked before a whole chunk is tested as UUID/date.
+PROBE_ROWS = 100
+# Decimal places above which a number is stored as DOUBLE PRECISION.
+MAX_NUMERIC_SCALE = 4
+# Minimum precision for NUMERIC columns (leaves headroom for new data).
+MIN_NUMERIC_PRECISION = 10
+
+UUID_PATTERN = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+INT_PATTERN = r'[+-]?\d+'
+BOOL_VALUES = {'true', 'false', 't', 'f'}
+
+INT_RANGES = [
+    ('SMALLINT', -2**15, 2**15 - 1),
+    ('INTEGER', -2**31, 2**31 - 1),
+    ('BIGINT', -2**63, 2**63 - 1),
+]
+
+
+def _all_match(s, predicate):
+    """Apply a vectorized predicate to a short prefix first, then to the whole chunk."""
+    for part in (s.iloc[:PROBE_ROWS], s):
+        if not predicate(part).all():
+            return False
+    return True
+
+
+class ColumnStats:
+    """
+    Running statistics for one CSV column, updated chunk by chunk.
+
+    Values are read as strings, so every candidate type (number, date, UUID)
+    is checked against the original text. A candidate is dropped as soon as a
+    chunk contradicts it and is not tested again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.max_len = 0
+        self.min = None
+        self.max = None
+        self.max_int_digits = 0
+        self.scale = 0
+        self.is_numeric = True
+        self.is_integral = True
+        self.is_date = True
+        self.is_uuid = True
+        self.is_bool = True
+        self.date_format = None
+        self.date_suffix = ''
+        self.values = set()          # exact distinct values while small
+        self.distinct_estimate = 0   # lower bound once `values` overflows
+
+    def update(self, s):
+        """Fold one chunk (a Series of str/NaN) into the statistics."""
+        n = len(s)
+        s = s.dropna()
+        self.rows += n
+        self.nulls += n - len(s)
+        if s.empty:
+            return
+        seen_before = self.rows - self.nulls > len(s)
+
+        self._update_distinct(s)
+        # Measured on every chunk: numeric text like "1.000000" is wider
+        # than its digits if the column later falls back to VARCHAR.
+        self.max_len = max(self.max_len, int(s.str.len().max()))
+        if self.is_numeric:
+            self._update_numeric(s, seen_before)
+        if self.is_numeric:
+            return
+
+        if self.is_bool:
+            self.is_bool = bool(s.str.lower().isin(BOOL_VALUES).all())
+        if self.is_uuid:
+            self.is_uuid = _all_match(s, lambda part: part.str.fullmatch(UUID_PATTERN))
+            # Earlier chunks were only validated as UUIDs, not as dates.
+            self.is_date = self.is_date and (self.is_uuid or not seen_before)
+        if self.is_date and not self.is_uuid:
+            self._update_date(s)
+
+    def _update_distinct(self, s):
+        chunk_distinct = s.unique()
+        self.distinct_estimate = max(self.distinct_estimate, len(chunk_distinct))
+        if self.values is not None:
+            self.values.update(chunk_distinct)
+            if len(self.values) > ENUM_MAX_VALUES:
+                self.distinct_estimate = max(self.distinct_estimate, len(self.values))
+                self.values = None
+            else:
+                self.distinct_estimate = len(self.values)
+
+    def _update_numeric(self, s, seen_before):
+        nums = pd.to_numeric(s.iloc[:PROBE_ROWS], errors='coerce')
+        if not nums.isna().any():
+            nums = pd.to_numeric(s, errors='coerce')
+        if nums.isna().any() or not np.isfinite(nums.to_numpy(dtype=np.float64)).all():
+            # "inf"/"nan" parse as floats but fit no exact SQL number type.
+            self.is_numeric = False
+            self.is_uuid = self.is_date = not seen_before
+            return
+        lo, hi = nums.min(), nums.max()
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        self.max_int_digits = max(self.max_int_digits, len(str(int(max(abs(lo), abs(hi))))))
+        # The loader copies the original text, and integer columns reject
+        # "5.0" or "1e5" even though they parse as integral numbers.
+        if self.is_integral:
+            self.is_integral = _all_match(s, lambda part: part.str.fullmatch(INT_PATTERN))
+        if pd.api.types.is_integer_dtype(nums.dtype):
+            return
+
+        values = nums.to_numpy()
+        scale = MAX_NUMERIC_SCALE + 1
+        for k in range(self.scale, MAX_NUMERIC_SCALE + 1):
+            scaled = values * 10 ** k
+            if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-6):
+                scale = k
+                break
+        self.scale = max(self.scale, scale)
+        self.is_integral = self.is_integral and self.scale == 0
+
+    def _update_date(self, s):
+        # The format is guessed once from the first value; the zone name (if
+        # any) is stripped so pandas can use its fast fixed-format parser.
+        if self.date_format is None:
+            first = s.iloc[0]
+            fmt = guess_datetime_format(first)
+            if fmt is None:
+                self.is_date = False
+                return
+            self.date_format, self.date_suffix = fmt, ''
+            if fmt.endswith(' %Z'):
+                self.date_format = fmt[:-3]
+                self.date_suffix = ' ' + first.rsplit(' ', 1)[1]
+        if self.date_suffix:
+            s = s.str.removesuffix(self.date_suffix)
+        self.is_date = _all_match(
+            s, lambda part: pd.to_datetime(part, format=self.date_format, errors='coerce').notna()
+        )
+
+    @property
+    def is_enum(self):
+        return (self.values is not None and not self.is_numeric and not self.is_date
+                and not self.is_bool and self.rows - self.nulls >= ENUM_MIN_ROWS)
+
+    def sql_type(self):
+        """Choose the most compact SQL type that fits every value seen."""
+        if self.rows == self.nulls:
+            return 'TEXT'
+        if self.is_numeric:
+            if self.is_integral and self.scale == 0:
+                for name, lo, hi in INT_RANGES:
+                    if lo <= self.min and self.max <= hi:
+                        return name
+                return 'NUMERIC'
+            if self.scale <= MAX_NUMERIC_SCALE:
+                precision = max(self.max_int_digits + self.scale, MIN_NUMERIC_PRECISION)
+                return f'NUMERIC({precision},{self.scale})'
+            return 'DOUBLE PRECISION'
+        if self.is_bool:
+            return 'BOOLEAN'
+        if self.is_uuid:
+            return 'UUID'
+        if self.is_date:
+            return 'TIMESTAMP'
+        if self.is_enum:
+            return f'"{enum_type_name(self.name)}"'
+        if self.max_len < 256:
+            return f'VARCHAR({self.max_len})'
+        return 'TEXT'
+
+    def __repr__(self):
+        return (f'ColumnStats({self.name!r}, type={self.sql_type()}, '
+                f'nulls={self.nulls}/{self.rows}, distinct~{self.distinct_estimate})')
+
+
+def enum_type_name(column):
+    """Enum types are shared by column name so monthly tables stay UNION-compatible."""
+    return f'{column}_enum'
+
+
+def infer_schema(csv_path, chunk_rows=CHUNK_ROWS):
+    """
+    Scan the whole CSV once, in chunks of `chunk_rows`, and return a list of
+    ColumnStats (one per column, in file order). Memory is bounded by one chunk.
+    """
+    stats = None
+    for chunk in pd.read_csv(csv_path, dtype=str, keep_default_na=False,
+                             na_values=[''], chunksize=chunk_rows):
+        if stats is None:
+            stats = [ColumnStats(col) for col in chunk.columns]
+        for col_stats in stats:
+            col_stats.update(chunk[col_stats.name])
+    if stats is None:
+        header = pd.read_csv(csv_path, nrows=0).columns
+        stats = [ColumnStats(col) for col in header]
+    return stats
+
+
+def merge_enum_values(schemas):
+    """Union the enum values of every enum column across several schemas."""
+    enums = {}
+    for schema in schemas:
+        for col in schema:
+            if col.is_enum:
+                enums.setdefault(col.name, set()).update(col.values)
+    return enums
+
+
+def ensure_enum_types(conn, enums):
+    """
+    Create the shared enum types, or add missing values to existing ones,
+    then commit. Must run before the tables using them are created.
+    """
+    cur = conn.cursor()
+    for column, values in enums.items():
+        type_name = enum_type_name(column)
+        cur.execute("SELECT to_regtype(%s) IS NOT NULL", (f'"{type_name}"',))
+        if not cur.fetchone()[0]:
+            labels = ', '.join(cur.mogrify('%s', (v,)).decode() for v in sorted(values))
+            cur.execute(f'CREATE TYPE "{type_name}" AS ENUM ({labels});')
+            continue
+        cur.execute(f'SELECT unnest(enum_range(NULL::"{type_name}"))::text;')
+        existing = {row[0] for row in cur.fetchall()}
+        for value in sorted(set(values) - existing):
+            cur.execute(f'ALTER TYPE "{type_name}" ADD VALUE IF NOT EXISTS %s;', (value,))
+    conn.commit()
+    cur.close()
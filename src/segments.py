@@ -0,0 +1,173 @@
+"""
+Versioned customer segmentation model.
+
+A model holds the scaler statistics and k-means centroids of one training
+run. It is saved as a small JSON artifact (segments-v0001.json,
+segments-v0002.json, ...), so that new users are labelled by a cheap
+nearest-centroid scoring pass instead of a retrain.
+
+Clusters are renumbered by ascending centroid spend when the model is
+built. Cluster 0 is therefore always the lowest-spending segment, and
+segment names no longer depend on the arbitrary indices k-means produced.
+"""
+import os
+import re
+import json
+import datetime
+
+import numpy as np
+import pandas as pd
+
+MODEL_DIR = os.environ.get(
+    'SEGMENT_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'models'))
+FORMAT_VERSION = 1
+FEATURES = ('purchase_count', 'total_spending')
+# Names by ascending spend, used when the model has this many clusters.
+SEGMENT_NAMES = ('Inactive Customers', 'Standard Customers', 'Silver Customers', 'Gold Customers')
+
+_ARTIFACT = re.compile(r'^segments-v(\d+)\.json$')
+
+
+def segment_names(n_clusters):
+    """Names of clusters 0..n_clusters-1, ordered by ascending spend."""
+    if n_clusters == len(SEGMENT_NAMES):
+        return list(SEGMENT_NAMES)
+    return [f'Segment {i + 1}' for i in range(n_clusters)]
+
+
+def _versions(model_dir):
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(int(m.group(1)) for m in map(_ARTIFACT.match, os.listdir(model_dir)) if m)
+
+
+def _artifact_path(model_dir, version):
+    return os.path.join(model_dir, f'segments-v{version:04d}.json')
+
+
+class SegmentModel:
+    def __init__(self, mean, scale, centers, names=None, features=FEATURES, version=None, meta=None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.features = list(features)
+        self.names = list(names) if names is not None else segment_names(len(self.centers))
+        self.version = version
+        self.meta = dict(meta or {})
+        if self.centers.shape[1] != len(self.features) or len(self.names) != len(self.centers):
+            raise ValueError("centers, features and names do not match")
+
+    @classmethod
+    def from_fit(cls, scaler, kmeans, features=FEATURES, **meta):
+        """
+        Model from a fitted StandardScaler and (MiniBatch)KMeans, with the
+        clusters reordered by ascending total_spending of their centroid.
+        """
+        features = list(features)
+        centers = np.asarray(kmeans.cluster_centers_, dtype=np.float64)
+        j = features.index('total_spending')
+        spend = centers[:, j] * scaler.scale_[j] + scaler.mean_[j]
+        order = np.argsort(spend, kind='stable')
+        return cls(scaler.mean_, scaler.scale_, centers[order], features=features, meta=meta)
+
+    @property
+    def n_clusters(self):
+        return len(self.centers)
+
+    @property
+    def centers_original(self):
+        """Centroids in the original feature units, one row per cluster."""
+        return pd.DataFrame(self.centers * self.scale + self.mean, columns=self.features,
+                            index=pd.Index(self.names, name='segment'))
+
+    def transform(self, X):
+        """Scale raw feature rows as the training scaler did."""
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    def predict(self, X, scaled=False):
+        """Index of the nearest centroid for every row of X."""
+        Z = np.asarray(X, dtype=np.float64) if scaled else self.transform(X)
+        # argmin ||z - c||^2 = argmin (||c||^2 - 2 z.c); ||z||^2 is the same for every c.
+        distances = (self.centers ** 2).sum(axis=1) - 2.0 * (Z @ self.centers.T)
+        return np.argmin(distances, axis=1)
+
+    def to_dict(self):
+        return {
+            'format_version': FORMAT_VERSION,
+            'version': self.version,
+            'features': self.features,
+            'names': self.names,
+            'scaler_mean': self.mean.tolist(),
+            'scaler_scale': self.scale.tolist(),
+            'centers': self.centers.tolist(),
+            'meta': self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"unsupported segment model format: {data.get('format_version')}")
+        return cls(data['scaler_mean'], data['scaler_scale'], data['centers'], data['names'],
+                   data['features'], data['version'], data['meta'])
+
+    def same_fit(self, other):
+        """True when `other` has the same features, names, scaler and centroids."""
+        return (self.features == other.features and self.names == other.names
+                and all(np.array_equal(a, b) for a, b in
+                        ((self.mean, other.mean), (self.scale, other.scale),
+                         (self.centers, other.centers))))
+
+    def save(self, model_dir=MODEL_DIR):
+        """
+        Write the model as the next version in model_dir and return its path.
+        A model identical to the latest version (the same fit run again) is
+        not written again: it takes that version and path.
+        """
+        os.makedirs(model_dir, exist_ok=True)
+        versions = _versions(model_dir)
+        if versions:
+            try:
+                latest = SegmentModel.load(versions[-1], model_dir)
+            except (OSError, ValueError, KeyError):
+                latest = None
+            if latest is not None and latest.same_fit(self):
+                self.version = latest.version
+                return _artifact_path(model_dir, self.version)
+        self.version = (versions[-1] if versions else 0) + 1
+        self.meta.setdefault('created_at', datetime.datetime.now(datetime.timezone.utc).isoformat())
+        path = _artifact_path(model_dir, self.version)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, version=None, model_dir=MODEL_DIR):
+        """Load one version of the model (the latest by default)."""
+        if version is None:
+            versions = _versions(model_dir)
+            if not versions:
+                raise FileNotFoundError(f"no segment model saved in {model_dir}")
+            version = versions[-1]
+        with open(_artifact_path(model_dir, version), encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self):
+        return f"SegmentModel(version={self.version}, n_clusters={self.n_clusters})"
+
+
+def assign_segments(user_metrics, model=None):
+    """
+    Label users by nearest centroid. Returns a copy of `user_metrics` with
+    'cluster' (-1 where a feature is missing) and 'segment' columns.
+    `model` defaults to the latest saved SegmentModel.
+    """
+    model = model or SegmentModel.load()
+    X = user_metrics[model.features].to_numpy(dtype=np.float64)
+    complete = ~np.isnan(X).any(axis=1)
+    clusters = np.full(len(X), -1, dtype=np.int64)
+    clusters[complete] = model.predict(X[complete])
+    names = np.asarray(model.names + [None], dtype=object)
+    return user_metrics.assign(cluster=clusters, segment=names[clusters])
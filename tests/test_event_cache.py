@@ -0,0 +1,26 @@
+import pandas as pd
+
+import event_cache
+
+CSV = """event_time,event_type,product_id,price,user_id,user_session
+2022-10-01 00:00:00 UTC,view,5,1.5,,s1
+2022-10-01 00:00:01 UTC,cart,6,2.25,7,s2
+2022-10-01 23:59:59 UTC,,7,,8,s3
+"""
+
+
+def test_load_frame_matches_read_csv(tmp_path):
+    path = tmp_path / 'data_2022_oct.csv'
+    path.write_text(CSV)
+    cached = event_cache.load_frame(path, cache_dir=tmp_path / 'cache')
+    parsed = pd.read_csv(path, dtype={'price': 'float32', 'user_id': 'Int64'})
+
+    pd.testing.assert_series_equal(cached['user_id'], parsed['user_id'])
+    pd.testing.assert_series_equal(cached['price'], parsed['price'])
+    pd.testing.assert_series_equal(cached['event_time'],
+                                   event_cache.parse_event_times(parsed['event_time']))
+    assert cached['event_type'].tolist()[:2] == ['view', 'cart']
+    assert cached['event_type'].isna().tolist() == [False, False, True]
+    # Second read comes from the memory-mapped entry.
+    again = event_cache.load_frame(path, ['user_id'], cache_dir=tmp_path / 'cache')
+    assert again['user_id'].isna().tolist() == [True, False, False]
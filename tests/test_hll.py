@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from hll import DEFAULT_ERROR, HyperLogLog, precision_for_error
+
+P = precision_for_error(DEFAULT_ERROR)
+M = 1 << P
+
+
+def test_precision_for_error():
+    assert P == 14
+    assert HyperLogLog.for_error(0.05).error <= 0.05
+
+
+def test_empty_and_small_counts():
+    assert HyperLogLog(P).count() == 0
+    assert HyperLogLog(P).add(np.array([7, 7, 7])).count() == 1
+    assert abs(HyperLogLog(P).add(np.arange(1000)).count() - 1000) <= 10
+
+
+@pytest.mark.parametrize('n', [int(M * f) for f in (2.5, 2.75, 3.0, 3.5, 4.0, 5.0)])
+def test_no_bias_in_the_mid_range(n):
+    # The raw estimator with a linear-counting switch is ~2% high here.
+    rng = np.random.default_rng(n)
+    errors = [HyperLogLog(P).add(rng.choice(2**40, n, replace=False)).count() / n - 1
+              for _ in range(16)]
+    assert abs(np.mean(errors)) < 0.0075
+    assert max(abs(e) for e in errors) < 4 * DEFAULT_ERROR
+
+
+def test_merged_days_match_the_union():
+    rng = np.random.default_rng(0)
+    users = rng.choice(2**40, 120000, replace=False)
+    days = [rng.choice(users, 20000, replace=False) for _ in range(30)]
+    month = HyperLogLog(P)
+    for day in days:
+        month.merge(HyperLogLog(P).add(day))
+    exact = len(np.unique(np.concatenate(days)))
+    assert abs(month.count() / exact - 1) < 3 * DEFAULT_ERROR
+    assert month.count() == HyperLogLog(P).add(np.concatenate(days)).count()
+
+
+def test_bytes_round_trip_and_precision_checks():
+    sketch = HyperLogLog(P).add(np.arange(5000))
+    restored = HyperLogLog.from_bytes(P, sketch.to_bytes())
+    assert restored.count() == sketch.count()
+    with pytest.raises(ValueError):
+        sketch.merge(HyperLogLog(P - 1))
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
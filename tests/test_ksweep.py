@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+
+import ksweep
+
+
+@pytest.fixture(scope='module')
+def features():
+    rng = np.random.default_rng(0)
+    centers = np.array([[1, 20], [3, 300], [8, 900], [2, 80], [6, 500]], dtype=float)
+    return np.vstack([c + rng.normal(0, [0.4, 15], (400, 2)) for c in centers])
+
+
+def reference_wcss(X, k):
+    return KMeans(n_clusters=k, n_init='auto', max_iter=300,
+                  random_state=ksweep.RANDOM_STATE).fit(X).inertia_
+
+
+def test_scaled_matrix_is_contiguous_float32(features):
+    X = ksweep.scaled_matrix(features)
+    assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS']
+    assert np.allclose(X.mean(axis=0), 0, atol=1e-5) and np.allclose(X.std(axis=0), 1, atol=1e-4)
+
+
+def test_parallel_sweep_matches_independent_fits(features):
+    X = ksweep.scaled_matrix(features)
+    results = ksweep.sweep(features, [2, 3, 4], strategy='parallel', workers=2)
+    assert [r['k'] for r in results] == [2, 3, 4]
+    for r in results:
+        assert r['wcss'] == pytest.approx(reference_wcss(X, r['k']), rel=1e-5)
+        assert r['centers'].shape == (r['k'], 2)
+        assert 'labels' not in r
+
+
+def test_warm_sweep_is_as_good_as_cold_fits(features):
+    X = ksweep.scaled_matrix(features)
+    results = ksweep.sweep(features, range(1, 7), strategy='warm')
+    wcss = [r['wcss'] for r in results]
+    assert all(a > b for a, b in zip(wcss, wcss[1:]))
+    for r in results:
+        assert r['wcss'] <= reference_wcss(X, r['k']) * 1.02
+    assert np.isnan(results[0]['silhouette'])
+    assert all(-1 <= r['silhouette'] <= 1 for r in results[1:])
+
+
+def test_next_init_splits_the_worst_cluster(features):
+    X = ksweep.scaled_matrix(features)
+    model = KMeans(n_clusters=2, n_init='auto', random_state=0).fit(X)
+    init = ksweep._next_init(X, model.cluster_centers_.astype(np.float32), model.labels_)
+    assert init.shape == (3, 2) and init.dtype == X.dtype
+
+
+def test_unknown_strategy(features):
+    with pytest.raises(ValueError):
+        ksweep.sweep(features, [2], strategy='random')
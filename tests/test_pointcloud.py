@@ -0,0 +1,87 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+import pointcloud
+from pointcloud import scatter, stratified_sample
+
+
+@pytest.fixture
+def ax():
+    fig, ax = plt.subplots()
+    yield ax
+    plt.close(fig)
+
+
+def cloud(n, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.choice(['a', 'b', 'c'], n, p=[0.9, 0.09, 0.01])
+    return rng.normal(size=n), rng.normal(size=n), labels
+
+
+def test_stratified_sample_keeps_proportions_and_small_classes():
+    _, _, labels = cloud(200000)
+    keep = stratified_sample(labels, max_points=3000)
+    assert np.all(np.diff(keep) > 0)
+    assert len(keep) <= 3000
+    assert len(keep) >= 2990
+    kept = {c: int(np.sum(labels[keep] == c)) for c in 'abc'}
+    total = {c: int(np.sum(labels == c)) for c in 'abc'}
+    assert min(kept['b'], kept['c']) >= 3000 // 6
+    assert kept['a'] > kept['b'] + kept['c']
+
+
+def test_stratified_sample_is_proportional_without_small_classes():
+    labels = np.repeat(['a', 'b'], [60000, 40000])
+    keep = stratified_sample(labels, max_points=1000)
+    assert np.sum(labels[keep] == 'a') == 600 and np.sum(labels[keep] == 'b') == 400
+
+
+def test_stratified_sample_small_input_is_untouched():
+    assert stratified_sample(['x', 'y', 'x'], max_points=10).tolist() == [0, 1, 2]
+
+
+def test_points_mode_draws_every_point_per_class(ax):
+    x, y, labels = cloud(1000)
+    assert scatter(ax, x, y, labels, colors={'b': 'red', 'a': 'blue'}) == 'points'
+    assert [c.get_label() for c in ax.collections] == ['b', 'a']
+    for collection, cls in zip(ax.collections, 'ba'):
+        mask = labels == cls
+        assert np.array_equal(collection.get_offsets(), np.column_stack([x[mask], y[mask]]))
+
+
+def test_auto_samples_labelled_clouds(ax):
+    x, y, labels = cloud(50000)
+    assert scatter(ax, x, y, labels, max_points=2000) == 'sample'
+    drawn = sum(len(c.get_offsets()) for c in ax.collections)
+    assert 1990 <= drawn <= 2000
+    assert {c.get_label() for c in ax.collections} == {'a', 'b', 'c'}
+
+
+def test_auto_draws_unlabelled_clouds_as_density(ax):
+    x, y, _ = cloud(50000)
+    assert scatter(ax, x, y, label='users', max_points=2000) == 'density'
+    hexbin = ax.collections[0]
+    assert hexbin.get_array().sum() == len(x)
+    assert ax.get_legend_handles_labels()[1] == ['users']
+
+
+def test_density_per_class_with_legend(ax):
+    x, y, labels = cloud(20000)
+    x[0] = np.nan
+    assert scatter(ax, x, y, labels, mode='density', bins=50) == 'density'
+    assert len(ax.images) == 3
+    alpha = ax.images[0].get_array()[..., 3]
+    assert alpha.max() == pytest.approx(1.0) and alpha.min() >= 0
+    assert sorted(ax.get_legend_handles_labels()[1]) == ['a', 'b', 'c']
+
+
+def test_unknown_mode(ax):
+    with pytest.raises(ValueError):
+        scatter(ax, [0], [0], mode='heatmap')
+
+
+def test_max_points_default_comes_from_module():
+    assert pointcloud.MAX_POINTS > 0
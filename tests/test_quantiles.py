@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib import cbook
+
+from quantiles import QuantileSketch
+
+
+def cent_prices(n, seed):
+    """Prices as parsed from text with two decimals (e.g. 30.4, not 3040 * 0.01)."""
+    cents = np.round(np.random.default_rng(seed).lognormal(1.5, 1.0, n) * 100).astype(np.int64)
+    return np.array([float(f'{c / 100:.2f}') for c in cents])
+
+
+def sketches(prices):
+    """The same data through add(), merge() and add_counts()."""
+    half = len(prices) // 2
+    merged = QuantileSketch().add(prices[:half]).merge(QuantileSketch().add(prices[half:]))
+    values, counts = np.unique(prices, return_counts=True)
+    return [QuantileSketch().add(prices), merged, QuantileSketch().add_counts(values, counts)]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_box_stats_match_numpy_and_matplotlib_exactly(seed):
+    prices = cent_prices(300000, seed)
+    reference = cbook.boxplot_stats(prices)[0]
+    q1, med, q3 = np.percentile(prices, [25, 50, 75])
+    for sketch in sketches(prices):
+        box = sketch.box_stats()
+        assert (box['q1'], box['med'], box['q3']) == (q1, med, q3)
+        assert (box['whislo'], box['whishi']) == (reference['whislo'], reference['whishi'])
+        fliers, counts = sketch.outliers()
+        assert np.array_equal(np.repeat(fliers, counts), np.sort(reference['fliers']))
+        assert box['n_low_outliers'] + box['n_high_outliers'] == len(reference['fliers'])
+
+
+def test_values_do_not_drift():
+    sketch = QuantileSketch().add([30.4, 30.4, 0.1, 0.7])
+    assert sketch.values.tolist() == [0.1, 0.7, 30.4]
+    assert sketch.quantile(1.0) == 30.4
+
+
+@pytest.mark.parametrize('q', [0, 0.01, 0.1, 0.25, 0.333, 0.5, 0.9, 0.99, 1])
+def test_quantiles_without_resolution_match_numpy(q):
+    values = np.random.default_rng(1).normal(size=5001)
+    sketch = QuantileSketch(resolution=None).add(values)
+    assert sketch.quantile(q) == np.quantile(values, q)
+
+
+def test_describe_matches_pandas():
+    prices = cent_prices(10000, 5)
+    ours = QuantileSketch().add(prices).describe()
+    theirs = pd.Series(prices).describe()
+    for key, value in theirs.items():
+        assert ours[key] == pytest.approx(value, rel=1e-12), key
+
+
+def test_nan_empty_and_resolution_checks():
+    sketch = QuantileSketch().add([np.nan, 1.0, np.nan])
+    assert sketch.n == 1 and sketch.quantile(0.5) == 1.0
+    assert math.isnan(QuantileSketch().quantile(0.5))
+    assert QuantileSketch(resolution=0.5).add([1.26, 2.74]).values.tolist() == [1.5, 2.5]
+    with pytest.raises(ValueError):
+        QuantileSketch().merge(QuantileSketch(resolution=None))
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from schema import ColumnStats, infer_schema
+
+
+def column_type(*chunks):
+    stats = ColumnStats('col')
+    for chunk in chunks:
+        stats.update(pd.Series(chunk, dtype=object))
+    return stats.sql_type()
+
+
+@pytest.mark.parametrize('values, expected', [
+    (['1', '-2', '+3'], 'SMALLINT'),
+    (['1', '70000'], 'INTEGER'),
+    (['1', '5000000000'], 'BIGINT'),
+    (['1.5', '2.25'], 'NUMERIC(10,2)'),
+    (['0.123456', '1'], 'DOUBLE PRECISION'),
+])
+def test_numeric_types(values, expected):
+    assert column_type(values) == expected
+
+
+@pytest.mark.parametrize('values', [['5.0', '6'], ['1e5', '2'], ['7', '8.00']])
+def test_integral_text_that_is_not_an_integer_literal_is_numeric(values):
+    assert column_type(values) == 'NUMERIC(10,0)'
+
+
+def test_integer_literal_check_spans_chunks():
+    assert column_type(['1', '2'], ['3.0']) == 'NUMERIC(10,0)'
+    assert column_type(['3.0'], ['1', '2']) == 'NUMERIC(10,0)'
+
+
+@pytest.mark.parametrize('bad', ['inf', '-inf', 'Infinity', 'nan'])
+def test_non_finite_values_fall_back_to_varchar(bad):
+    assert column_type(['1', '2.5', bad]) == f'VARCHAR({max(3, len(bad))})'
+
+
+def test_varchar_width_covers_earlier_numeric_chunks():
+    assert column_type(['1.0000000000'], ['abc']) == 'VARCHAR(12)'
+
+
+def test_nulls_and_other_types():
+    assert column_type([None, None]) == 'TEXT'
+    assert column_type(['true', 'F', None]) == 'BOOLEAN'
+    assert column_type(['2022-10-01 00:00:00 UTC', '2022-10-02 12:30:00 UTC']) == 'TIMESTAMP'
+    assert column_type(['0f8fad5b-d9cb-469f-a165-70867728950e']) == 'UUID'
+
+
+def test_infer_schema_reads_chunks(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('id,price,note\n1,1.50,a\n2,,b\n3,2.25,inf\n')
+    stats = infer_schema(path, chunk_rows=2)
+    assert [c.sql_type() for c in stats] == ['SMALLINT', 'NUMERIC(10,2)', 'VARCHAR(3)']
+    assert stats[1].nulls == 1
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+
+from segments import SEGMENT_NAMES, SegmentModel, assign_segments
+
+
+@pytest.fixture
+def fitted():
+    rng = np.random.default_rng(0)
+    centers = np.array([[1, 20], [3, 300], [8, 900], [2, 80]], dtype=float)
+    X = np.vstack([c + rng.normal(0, [0.3, 10], (500, 2)) for c in centers])
+    scaler = StandardScaler().fit(X)
+    kmeans = KMeans(n_clusters=4, random_state=42, n_init=3).fit(scaler.transform(X))
+    return X, scaler, kmeans, SegmentModel.from_fit(scaler, kmeans, n_users=len(X))
+
+
+def test_clusters_are_ordered_by_spend(fitted):
+    _, _, _, model = fitted
+    spend = model.centers_original['total_spending'].to_numpy()
+    assert np.all(np.diff(spend) > 0)
+    assert list(model.centers_original.index) == list(SEGMENT_NAMES)
+
+
+def test_predict_matches_kmeans_up_to_the_renumbering(fitted):
+    X, scaler, kmeans, model = fitted
+    ours = model.predict(X)
+    theirs = kmeans.predict(scaler.transform(X))
+    # Each k-means cluster maps to exactly one of ours.
+    pairs = set(zip(theirs.tolist(), ours.tolist()))
+    assert len(pairs) == 4 and len({o for _, o in pairs}) == 4
+
+
+def test_save_load_and_unchanged_fit_is_not_saved_again(fitted, tmp_path):
+    _, scaler, kmeans, model = fitted
+    path = model.save(tmp_path)
+    assert model.version == 1
+    loaded = SegmentModel.load(model_dir=tmp_path)
+    assert loaded.same_fit(model) and loaded.meta['n_users'] == 2000
+
+    again = SegmentModel.from_fit(scaler, kmeans)
+    assert again.save(tmp_path) == path and again.version == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    changed = SegmentModel(model.mean, model.scale, model.centers * 1.01)
+    changed.save(tmp_path)
+    assert changed.version == 2
+    assert SegmentModel.load(model_dir=tmp_path).version == 2
+    assert SegmentModel.load(1, model_dir=tmp_path).same_fit(model)
+
+
+def test_assign_segments_marks_missing_features(fitted):
+    _, _, _, model = fitted
+    users = pd.DataFrame({'purchase_count': [1.0, np.nan, 8.0],
+                          'total_spending': [20.0, 50.0, 900.0]})
+    out = assign_segments(users, model)
+    assert out['cluster'].tolist() == [0, -1, 3]
+    assert out['segment'].tolist() == ['Inactive Customers', None, 'Gold Customers']
+
+
+def test_load_without_models(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SegmentModel.load(model_dir=tmp_path)